@@ -0,0 +1,205 @@
+"""Non-interactive runs of the site search and development analysis over many programmes.
+
+Specs are read from a JSON list or a CSV file with the fields asked for by get_inputs:
+version, quality_level, min_residents, max_residents, stories and sqm_per_resident.
+The GIS layers, the site search with its indexes and a plot topology are built once and
+shared by all specs; development conditions of a site are computed once even when it
+ranks in the top N of several specs. With use_metrics_table the metrics of all built-up
+plots are materialized once (see PlotMetricsTable) and each site analysis is a radius query.
+Road access resolved for any plot is kept in the process-wide road access cache and, with a
+metric cache, persisted to road_access.parquet in its directory between runs.
+
+Output layout under output_dir:
+- summary.csv: one row per spec
+- v<version>/space_program.csv, candidates.gpkg and conditions.csv per spec
+- sites/site_<plot_id>_conditions.dxf per analyzed site, when DXF export is enabled
+"""
+import json
+import os
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from .development_conditions import DevelopmentConditions, PlotMetricsTable, RoadAccessService
+from .layers import LayerBundle
+from .metric_cache import MetricCache
+from .models import RetirementHome
+from .programming import VALID_RANGES, load_staffing_benchmarks, save_space_program
+from .site_search import SiteSearch
+from .topology import PlotTopology
+
+SPEC_FIELDS = ['version', 'quality_level', 'min_residents', 'max_residents', 'stories', 'sqm_per_resident']
+
+# Assumed storey height when checking the permitted height against the programme
+STORY_HEIGHT = 3.5
+
+def load_specs(path: str) -> List[Dict]:
+    """Read and validate programme specs from a JSON list or a CSV file"""
+    if path.endswith('.json'):
+        with open(path) as f:
+            specs = json.load(f)
+    else:
+        specs = pd.read_csv(path, dtype={'version': str}).to_dict('records')
+    
+    for i, spec in enumerate(specs, 1):
+        missing = [field for field in SPEC_FIELDS if field not in spec]
+        if missing:
+            raise ValueError(f"Spec {i} is missing {', '.join(missing)}")
+        spec['version'] = str(spec['version'])
+        checks = [
+            ('quality_level', spec['quality_level']),
+            ('resident_count', spec['min_residents']),
+            ('resident_count', spec['max_residents']),
+            ('stories', spec['stories']),
+            ('sqm_per_resident', spec['sqm_per_resident'])
+        ]
+        for name, value in checks:
+            low, high = VALID_RANGES[name]
+            if not low <= value <= high:
+                raise ValueError(f"Spec {i} ({spec['version']}): {name} {value} outside {low}-{high}")
+        if spec['min_residents'] > spec['max_residents']:
+            raise ValueError(f"Spec {i} ({spec['version']}): min_residents exceeds max_residents")
+    return specs
+
+def build_home(spec: Dict, staffing_benchmarks=None) -> RetirementHome:
+    """Create the retirement home programme of a spec"""
+    quality_level = int(spec['quality_level'])
+    return RetirementHome(
+        version=spec['version'],
+        min_residents=int(spec['min_residents']),
+        max_residents=int(spec['max_residents']),
+        stories=int(spec['stories']),
+        quality_level=quality_level,
+        staffing_benchmarks=staffing_benchmarks[quality_level] if staffing_benchmarks else None,
+        sqm_per_resident=float(spec['sqm_per_resident'])
+    )
+
+class BatchRunner:
+    """Run search and development analysis for many specs over one set of loaded layers"""
+    
+    def __init__(self, layers: LayerBundle, output_dir: str = 'output/batch', n_top: int = 6,
+                 metric_cache: Optional[MetricCache] = None, export_dxf: bool = False,
+                 use_metrics_table: bool = False):
+        self.layers = layers
+        self.output_dir = output_dir
+        self.n_top = n_top
+        self.export_dxf = export_dxf
+        
+        # Shared across specs: the search keeps its indexes, the topology serves road lookups
+        self.search = SiteSearch.from_bundle(layers, metric_cache=metric_cache)
+        self.topology = PlotTopology(layers.plots, layers.roads)
+        self.search.topology = self.topology
+        self.road_access = RoadAccessService(layers.plots, layers.roads)
+        self.road_access_path = (os.path.join(metric_cache.cache_dir, 'road_access.parquet')
+                                 if metric_cache is not None else None)
+        if self.road_access_path is not None and os.path.exists(self.road_access_path):
+            self.road_access.cache.load(self.road_access_path)
+        self.metrics_table = None
+        if use_metrics_table:
+            cache_dir = metric_cache.cache_dir if metric_cache is not None else 'output/cache'
+            self.metrics_table = PlotMetricsTable.load_or_build(
+                layers.plots, layers.roads, layers.buildings, cache_dir=cache_dir, topology=self.topology,
+                building_assignment=layers.building_assignment
+            )
+        self.staffing_benchmarks = load_staffing_benchmarks()
+        
+        # Development conditions per plot id (or the error message), reused across specs
+        self._conditions = {}
+    
+    def run(self, specs: List[Dict]) -> pd.DataFrame:
+        """Process all specs and write the per-spec results and summary.csv"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        summary = []
+        for i, spec in enumerate(specs, 1):
+            print(f"\n=== Spec {i}/{len(specs)}: version {spec['version']} ===")
+            summary.append(self.run_spec(spec))
+        
+        summary = pd.DataFrame(summary)
+        if self.road_access_path is not None:
+            self.road_access.cache.save(self.road_access_path)
+        summary_path = os.path.join(self.output_dir, 'summary.csv')
+        summary.to_csv(summary_path, index=False)
+        print(f"\nBatch summary saved to: {summary_path}")
+        return summary
+    
+    def run_spec(self, spec: Dict) -> Dict:
+        """Search sites and analyze the top N for one spec, writing its results"""
+        home = build_home(spec, self.staffing_benchmarks)
+        gfa_range = home.calculate_gfa_range()
+        plot_range = home.calculate_plot_size_range()
+        spec_dir = os.path.join(self.output_dir, f"v{home.version}")
+        os.makedirs(spec_dir, exist_ok=True)
+        save_space_program(home, os.path.join(spec_dir, 'space_program.csv'))
+        
+        self.search.constraints.min_plot_area = plot_range[0]
+        self.search.constraints.max_plot_area = plot_range[1]
+        candidates = self.search.find_candidates()
+        
+        result = {
+            'version': home.version,
+            'min_plot_area': plot_range[0],
+            'max_plot_area': plot_range[1],
+            'candidates': len(candidates),
+            'best_plot_id': None,
+            'best_score': None,
+            'sites_analyzed': 0,
+            'sites_meeting_requirements': 0
+        }
+        if not candidates:
+            print("No suitable sites found for this spec")
+            return result
+        
+        candidate_gdf = candidates.to_geodataframe(crs=self.layers.plots.crs)
+        candidate_gdf.insert(0, 'rank', range(1, len(candidate_gdf) + 1))
+        candidate_gdf.to_file(os.path.join(spec_dir, 'candidates.gpkg'), driver='GPKG')
+        result['best_plot_id'] = candidates[0].plot_id
+        result['best_score'] = candidates[0].score
+        
+        rows = []
+        for rank, candidate in enumerate(candidates[:self.n_top], 1):
+            conditions = self._analyze(candidate)
+            row = {'rank': rank, 'plot_id': candidate.plot_id, 'score': candidate.score, 'area': candidate.area}
+            if isinstance(conditions, str):
+                row['error'] = conditions
+            else:
+                row.update(conditions)
+                row['meets_gfa'] = gfa_range[0] <= conditions['estimated_gfa'] <= gfa_range[1]
+                row['meets_plot_size'] = plot_range[0] <= conditions['site_area'] <= plot_range[1]
+                row['meets_stories'] = conditions['height'] / STORY_HEIGHT >= home.stories
+                row['error'] = None
+            rows.append(row)
+        
+        conditions_df = pd.DataFrame(rows)
+        conditions_df.to_csv(os.path.join(spec_dir, 'conditions.csv'), index=False)
+        analyzed = conditions_df['error'].isna()
+        result['sites_analyzed'] = int(analyzed.sum())
+        if analyzed.any():
+            meets = conditions_df.loc[analyzed, ['meets_gfa', 'meets_plot_size', 'meets_stories']].astype(bool).all(axis=1)
+            result['sites_meeting_requirements'] = int(meets.sum())
+        print(f"Results saved to: {spec_dir}")
+        return result
+    
+    def _analyze(self, candidate):
+        """Development conditions of a candidate site, or the reason they could not be determined"""
+        if candidate.plot_id not in self._conditions:
+            development = DevelopmentConditions(
+                site_candidate=candidate,
+                plots_gdf=self.layers.plots,
+                roads_gdf=self.layers.roads,
+                buildings_gdf=self.layers.buildings,
+                topology=self.topology,
+                metrics_table=self.metrics_table,
+                road_access=self.road_access,
+                building_assignment=self.layers.building_assignment
+            )
+            try:
+                self._conditions[candidate.plot_id] = development.analyze()
+                if self.export_dxf:
+                    sites_dir = os.path.join(self.output_dir, 'sites')
+                    os.makedirs(sites_dir, exist_ok=True)
+                    development.export_to_dxf(os.path.join(sites_dir, f"site_{candidate.plot_id}_conditions.dxf"))
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                print(f"Could not analyze development conditions of plot {candidate.plot_id}: {error}")
+                self._conditions[candidate.plot_id] = error
+        return self._conditions[candidate.plot_id]
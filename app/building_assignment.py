@@ -0,0 +1,67 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from typing import Optional
+
+class BuildingAssignment:
+    """Building-to-plot assignment by centroid, built once per pair of plot and building layers
+
+    A building belongs to every plot its centroid intersects (normally exactly one).
+    plot_of_building holds the first plot position of each building (-1 when its centroid
+    is on no plot). Plots are addressed by position; the buildings of plot i are
+    building_positions[offsets[i]:offsets[i + 1]], in building order.
+    """
+
+    def __init__(self, plots_gdf: gpd.GeoDataFrame, buildings_gdf: gpd.GeoDataFrame):
+        self.plots = plots_gdf
+        self.buildings = buildings_gdf
+        n_plots, n_buildings = len(plots_gdf), len(buildings_gdf)
+
+        centroids = shapely.centroid(np.asarray(buildings_gdf.geometry.values))
+        building_idx, plot_idx = plots_gdf.sindex.query(centroids, predicate='intersects')
+        order = np.lexsort((building_idx, plot_idx))
+        plot_idx, building_idx = plot_idx[order], building_idx[order]
+
+        # CSR layout: plot -> buildings
+        self.building_positions = building_idx
+        self.offsets = np.searchsorted(plot_idx, np.arange(n_plots + 1))
+        self.counts = np.diff(self.offsets)
+
+        # First plot of every building
+        self.plot_of_building = np.full(n_buildings, -1, dtype=np.intp)
+        by_building = np.lexsort((plot_idx, building_idx))
+        first = np.ones(len(by_building), dtype=bool)
+        first[1:] = building_idx[by_building][1:] != building_idx[by_building][:-1]
+        self.plot_of_building[building_idx[by_building][first]] = plot_idx[by_building][first]
+
+    def covers(self, plots_gdf: gpd.GeoDataFrame, buildings_gdf: gpd.GeoDataFrame) -> bool:
+        """Whether the assignment was built over these layers"""
+        return self.plots is plots_gdf and self.buildings is buildings_gdf
+
+    def buildings_of(self, position: int) -> np.ndarray:
+        """Positions of the buildings on a plot"""
+        return self.building_positions[self.offsets[position]:self.offsets[position + 1]]
+
+    def is_built_up(self, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Whether each plot (all plots by default) has at least one building"""
+        return self.counts > 0 if positions is None else self.counts[np.asarray(positions)] > 0
+
+    def pairs(self, positions: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Pairs of (plot, plot_id, building) for plots at the given positions, in plot order
+
+        'plot' is the index into positions (the position itself when all plots are taken), like
+        assign_buildings returns it for plots_gdf.iloc[positions].
+        """
+        if positions is None:
+            positions = np.arange(len(self.plots))
+        positions = np.asarray(positions, dtype=np.intp)
+        counts = self.counts[positions]
+        starts = np.repeat(self.offsets[positions], counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        plot = np.repeat(np.arange(len(positions)), counts)
+        return pd.DataFrame({
+            'plot': plot,
+            'plot_id': self.plots['gml_id'].to_numpy()[positions[plot]],
+            'building': self.building_positions[starts + within]
+        })
@@ -0,0 +1,158 @@
+"""Declarative hard constraints for the site search.
+
+Each constraint is a vectorized predicate returning a keep-mask for a set of plots. The
+engine evaluates constraints one after another on the plots that are still in play, so
+expensive spatial predicates only see plots that passed the cheap ones. Constraints are
+ordered by expected cost per rejected plot: cost per plot divided by rejection rate,
+both measured over earlier runs of the same engine once every constraint has seen
+MIN_OBSERVED_PLOTS plots, and taken from the declared estimates before that.
+
+New constraints plug in through ConstraintEngine.add; predicates are module-level
+functions so the engine can be sent to tile worker processes.
+"""
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from .models import SiteConstraints
+
+# Plots a constraint must have evaluated before its measured statistics replace the estimates
+MIN_OBSERVED_PLOTS = 1000
+
+@dataclass
+class Constraint:
+    """A hard constraint: predicate(search, plots) returns True for the plots to keep"""
+    name: str
+    predicate: Callable[..., np.ndarray]
+    cost: float = 1.0                 # Estimated relative cost per plot
+    rejection_rate: float = 0.5       # Estimated share of plots rejected
+    enabled: Optional[Callable[[SiteConstraints], bool]] = None  # Whether the settings activate it
+
+    def is_enabled(self, constraints: SiteConstraints) -> bool:
+        return self.enabled is None or bool(self.enabled(constraints))
+
+class ConstraintEngine:
+    """Evaluate hard constraints cheapest-and-most-selective first, with per-constraint statistics"""
+
+    def __init__(self, constraints: Optional[List[Constraint]] = None):
+        self.constraints: Dict[str, Constraint] = {}
+        # Observed (plots evaluated, plots rejected, seconds) per constraint over all runs
+        self.history: Dict[str, Tuple[int, int, float]] = {}
+        for constraint in constraints if constraints is not None else default_constraints():
+            self.add(constraint)
+
+    def add(self, constraint: Constraint):
+        """Register a constraint, replacing any constraint of the same name"""
+        self.constraints[constraint.name] = constraint
+
+    def remove(self, name: str):
+        """Unregister a constraint"""
+        self.constraints.pop(name, None)
+        self.history.pop(name, None)
+
+    def _rank(self, constraint: Constraint) -> float:
+        """Expected cost of rejecting one plot with this constraint (lower runs first)"""
+        evaluated, rejected, seconds = self.history.get(constraint.name, (0, 0, 0.0))
+        if evaluated:
+            cost = seconds / evaluated
+            rejection_rate = rejected / evaluated
+        else:
+            cost = constraint.cost
+            rejection_rate = constraint.rejection_rate
+        return cost / max(rejection_rate, 1e-6)
+
+    def order(self, constraints: SiteConstraints) -> List[Constraint]:
+        """Enabled constraints in evaluation order"""
+        enabled = [c for c in self.constraints.values() if c.is_enabled(constraints)]
+        if any(self.history.get(c.name, (0, 0, 0.0))[0] < MIN_OBSERVED_PLOTS for c in enabled):
+            # Declared estimates are relative, not seconds, so mix them only once all are measured
+            return sorted(enabled, key=lambda c: c.cost / max(c.rejection_rate, 1e-6))
+        return sorted(enabled, key=self._rank)
+
+    def apply(self, search, plots: gpd.GeoDataFrame, record_history: bool = True) -> Tuple[gpd.GeoDataFrame, pd.DataFrame]:
+        """Return the plots passing every enabled constraint and a per-constraint report
+        
+        Without record_history the run is not added to the statistics that order later runs.
+        """
+        keep = np.ones(len(plots), dtype=bool)
+        rows = []
+        for constraint in self.order(search.constraints):
+            positions = np.flatnonzero(keep)
+            start = time.perf_counter()
+            if len(positions):
+                passed = np.asarray(constraint.predicate(search, plots.iloc[positions]), dtype=bool)
+                keep[positions[~passed]] = False
+            else:
+                passed = np.empty(0, dtype=bool)
+            seconds = time.perf_counter() - start
+            rejected = int((~passed).sum())
+            rows.append({
+                'constraint': constraint.name,
+                'evaluated': len(positions),
+                'rejected': rejected,
+                'seconds': seconds
+            })
+            if record_history:
+                evaluated_total, rejected_total, seconds_total = self.history.get(constraint.name, (0, 0, 0.0))
+                self.history[constraint.name] = (
+                    evaluated_total + len(positions), rejected_total + rejected, seconds_total + seconds
+                )
+
+        report = pd.DataFrame(rows, columns=['constraint', 'evaluated', 'rejected', 'seconds'])
+        return plots[keep], report
+
+def merge_reports(reports: List[pd.DataFrame]) -> pd.DataFrame:
+    """Sum per-constraint reports of several runs (e.g. tiles), keeping the first run's order"""
+    reports = [r for r in reports if r is not None and not r.empty]
+    if not reports:
+        return pd.DataFrame(columns=['constraint', 'evaluated', 'rejected', 'seconds'])
+    combined = pd.concat(reports, ignore_index=True)
+    return combined.groupby('constraint', sort=False, as_index=False)[['evaluated', 'rejected', 'seconds']].sum()
+
+def plot_area(search, plots: gpd.GeoDataFrame) -> np.ndarray:
+    """Plot area within [min_plot_area, max_plot_area]"""
+    areas = plots.geometry.area.to_numpy()
+    return (areas >= search.constraints.min_plot_area) & (areas <= search.constraints.max_plot_area)
+
+def shape_index(search, plots: gpd.GeoDataFrame) -> np.ndarray:
+    """Shape regularity index of at least min_shape_index"""
+    values = search._metric('shape_index', [], plots, search._shape_index_metric)['shape_index']
+    return values.to_numpy() >= search.constraints.min_shape_index
+
+def no_residential_building(search, plots: gpd.GeoDataFrame) -> np.ndarray:
+    """No residential building on the plot"""
+    has_building = search._metric(
+        'residential_building', ['buildings'], plots, search._residential_building_metric
+    )['has_residential_building']
+    return ~has_building.to_numpy(dtype=bool)
+
+def road_access(search, plots: gpd.GeoDataFrame) -> np.ndarray:
+    """Plot touches a plot crossed by a road"""
+    has_road_access = search._metric(
+        'road_access_snapped' if search.topology is not None and search.topology.snap_gaps else 'road_access',
+        ['roads'], plots, search._road_access_metric
+    )['has_road_access']
+    return has_road_access.to_numpy(dtype=bool)
+
+def max_distance_to_road(search, plots: gpd.GeoDataFrame) -> np.ndarray:
+    """Plot within max_distance_to_road of the nearest road"""
+    distances = search._metric('distance_to_road', ['roads'], plots, search._road_distance_metric)['distance_to_road']
+    return distances.to_numpy() <= search.constraints.max_distance_to_road
+
+def _has_max_distance_to_road(constraints: SiteConstraints) -> bool:
+    return constraints.max_distance_to_road is not None
+
+def default_constraints() -> List[Constraint]:
+    """The hard constraints of the site search, with rough relative cost estimates"""
+    return [
+        Constraint('plot_area', plot_area, cost=1.0, rejection_rate=0.9),
+        Constraint('shape_index', shape_index, cost=2.0, rejection_rate=0.3),
+        Constraint('max_distance_to_road', max_distance_to_road, cost=10.0, rejection_rate=0.2,
+                   enabled=_has_max_distance_to_road),
+        Constraint('no_residential_building', no_residential_building, cost=20.0, rejection_rate=0.5),
+        Constraint('road_access', road_access, cost=50.0, rejection_rate=0.3)
+    ]
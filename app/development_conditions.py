@@ -1,46 +1,266 @@
+import hashlib
+import os
+import time
+
 import geopandas as gpd
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import contextily as ctx
+import shapely
 from shapely.geometry import Point, LineString
 from typing import Optional, List, Dict, Tuple
-import ezdxf
-from ezdxf.enums import TextEntityAlignment
-from ezdxf.addons import text2path
-from ezdxf.addons.text2path import Kind  # Import Kind enum
+from .building_assignment import BuildingAssignment
+from .metric_cache import layer_fingerprint
+from .road_access_cache import ROAD_ACCESS_CACHE, RoadAccess, RoadAccessCache
+from .spatial import semi_join, semi_join_mask
+from .topology import PlotTopology
+from . import figures
+
+MIN_ROAD_FRONTAGE = 5.0        # minimum 5 meters of road frontage
+MAX_ROAD_NEIGHBOR_AREA = 10000  # road plots larger than this are not considered access roads
+ROAD_SIDE_BUFFER = 0.1          # tolerance used to find the road-facing side of a plot
+MIN_ANALYSIS_RADIUS = 50        # radius of the neighborhood analysis around a site, in meters
+MAX_ANALYSIS_RADIUS = 200
+PLOT_METRICS_VERSION = 3        # bump when built_up_plot_metrics changes, to invalidate saved tables
+
+PLOT_METRIC_COLUMNS = ['plot_id', 'building_coverage_ratio', 'floor_area_ratio', 'front_elevation_width',
+                       'adjacent', 'building_height', 'setback']
+CONDITION_COLUMNS = ['coverage_ratio_min', 'coverage_ratio_max', 'floor_area_ratio', 'height', 'front_width',
+                     'setback', 'frontage_length', 'analysis_radius', 'site_area', 'estimated_gfa']
+BUILT_UP_PLOT_COLUMNS = ['plot_id', 'building_coverage_ratio', 'floor_area_ratio', 'front_elevation_width',
+                         'building_height', 'setback', 'access_road_id', 'road_side', 'geometry']
 
-def get_road_neighbors(site_polygon, plots_gdf: gpd.GeoDataFrame, roads_gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+def _covers(topology: Optional[PlotTopology], plots_gdf: gpd.GeoDataFrame, roads_gdf: gpd.GeoDataFrame) -> bool:
+    """Whether a topology was built over these plot and road layers"""
+    return topology is not None and topology.plots is plots_gdf and topology.roads is roads_gdf
+
+def get_road_neighbors(site_polygon, plots_gdf: gpd.GeoDataFrame, roads_gdf: gpd.GeoDataFrame,
+                       topology: Optional[PlotTopology] = None,
+                       road_access: Optional['RoadAccessService'] = None) -> gpd.GeoDataFrame:
     """Get neighboring plots that have significant road access (intersection > 1m)."""
-    # Get all neighbors
-    neighbors = plots_gdf[plots_gdf.geometry.touches(site_polygon)]
+    plot_positions, road_positions = _road_neighbor_positions(site_polygon, plots_gdf, roads_gdf, topology, road_access)
+    return _sjoin_layout(plots_gdf, roads_gdf, plot_positions, road_positions)
+
+def _road_neighbor_positions(site_polygon, plots_gdf: gpd.GeoDataFrame, roads_gdf: gpd.GeoDataFrame,
+                             topology: Optional[PlotTopology] = None,
+                             road_access: Optional['RoadAccessService'] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Positions of the road neighbors and of their roads in the plot and road layers"""
+    if road_access is None or not road_access.covers(plots_gdf, roads_gdf):
+        road_access = RoadAccessService.shared(plots_gdf, roads_gdf)
+    
+    # Take the neighbors from the shared-edge index when it covers these layers and the site is one of its plots
+    if _covers(topology, plots_gdf, roads_gdf):
+        site_position = topology.locate(site_polygon)
+        if site_position is not None:
+            return road_access.road_neighbor_positions(site_polygon, topology.neighbors(site_position))
+    return road_access.road_neighbor_positions(site_polygon)
+
+def _sjoin_layout(plots_gdf: gpd.GeoDataFrame, roads_gdf: gpd.GeoDataFrame,
+                  plot_positions: np.ndarray, road_positions: np.ndarray) -> gpd.GeoDataFrame:
+    """Plot/road pairs laid out like gpd.sjoin(plots, roads, lsuffix='neighbor', rsuffix='road')"""
+    neighbors = plots_gdf.iloc[plot_positions]
+    roads = pd.DataFrame(roads_gdf.drop(columns=roads_gdf.geometry.name)).iloc[road_positions]
+    shared = set(neighbors.columns) & set(roads.columns)
+    neighbors = neighbors.rename(columns={c: f"{c}_neighbor" for c in shared})
+    roads = roads.rename(columns={c: f"{c}_road" for c in shared})
+    roads.insert(0, 'index_road', roads.index)
+    roads.index = neighbors.index
+    return pd.concat([neighbors, roads], axis=1)
+
+class RoadAccessService:
+    """Indexed road access lookups over one plot layer and one road layer
+    
+    Neighbors come from the plot spatial index and neighbor/road pairs from the road spatial
+    index; frontage lengths and road sides of a query are computed in batched shapely calls.
+    Roads are looked up by gml_id in a prebuilt index (the first road of each gml_id).
+    
+    resolve() memoizes the full road access of a plot (road neighbors, access road, road side
+    and frontage length) in a RoadAccessCache keyed by plot gml_id, plot position and a version
+    of the plot and road layers and the lookup path (geometric, or a topology with its
+    parameters); by default the cache is shared by the whole process.
+    """
+    
+    # Most recently requested shared service (see shared())
+    _shared: Optional['RoadAccessService'] = None
+    
+    def __init__(self, plots_gdf: gpd.GeoDataFrame, roads_gdf: gpd.GeoDataFrame,
+                 cache: Optional[RoadAccessCache] = None):
+        self.plots = plots_gdf
+        self.roads = roads_gdf
+        self.cache = cache if cache is not None else ROAD_ACCESS_CACHE
+        self.plot_geometries = np.asarray(plots_gdf.geometry.values)
+        self.road_geometries = np.asarray(roads_gdf.geometry.values)
+        road_ids = roads_gdf['gml_id'].to_numpy()
+        first = ~pd.Series(road_ids).duplicated().to_numpy()
+        self.road_ids = pd.Index(road_ids[first])
+        self.road_positions = np.flatnonzero(first)
+        self._version = None
+    
+    @classmethod
+    def shared(cls, plots_gdf: gpd.GeoDataFrame, roads_gdf: gpd.GeoDataFrame) -> 'RoadAccessService':
+        """Service over these layers, reused by every caller asking for the same layer objects"""
+        if cls._shared is None or not cls._shared.covers(plots_gdf, roads_gdf):
+            cls._shared = cls(plots_gdf, roads_gdf)
+        return cls._shared
+    
+    def covers(self, plots_gdf: gpd.GeoDataFrame, roads_gdf: gpd.GeoDataFrame) -> bool:
+        """Whether the service was built over these layers"""
+        return self.plots is plots_gdf and self.roads is roads_gdf
+    
+    def prepare(self):
+        """Compute the layer hash of the version now, e.g. once before forking worker processes"""
+        _ = self.version
+    
+    @property
+    def version(self) -> str:
+        """Hash of the plot and road layers and the road access parameters"""
+        if self._version is None:
+            parts = [layer_fingerprint(self.plots), layer_fingerprint(self.roads),
+                     f"{MIN_ROAD_FRONTAGE}|{MAX_ROAD_NEIGHBOR_AREA}|{ROAD_SIDE_BUFFER}"]
+            self._version = hashlib.sha256('|'.join(parts).encode()).hexdigest()[:16]
+        return self._version
+    
+    def locate(self, plot_geom) -> int:
+        """Position of the plot with exactly this geometry (-1 when it is not one of the plots)"""
+        for position in np.sort(self.plots.sindex.query(plot_geom, predicate='covers')):
+            if shapely.equals(self.plot_geometries[position], plot_geom):
+                return int(position)
+        return -1
     
-    # Join with roads
-    road_neighbors = gpd.sjoin(neighbors, roads_gdf, how='inner', predicate='intersects', lsuffix='neighbor', rsuffix='road')
+    def resolution_version(self, position: int, topology: Optional[PlotTopology] = None) -> str:
+        """Version of the road access of a plot: the layers and whether and how a topology resolves it"""
+        if position >= 0 and _covers(topology, self.plots, self.roads):
+            return f"{self.version}|topology|{topology.tolerance}|{topology.snap_gaps}"
+        return f"{self.version}|geometric"
     
-    # Filter by intersection length
-    min_road_length = 5.0  # minimum 5 meters of road frontage
-    valid_neighbors = []
+    def cache_key(self, plot_geom, plot_id, topology: Optional[PlotTopology] = None,
+                  position: Optional[int] = None) -> Tuple:
+        """(gml_id, position, version) under which the road access of a plot is cached"""
+        if position is None:
+            position = self.locate(plot_geom)
+        return plot_id, int(position), self.resolution_version(position, topology)
     
-    for _, neighbor in road_neighbors.iterrows():
-        intersection = neighbor.geometry.intersection(roads_gdf[roads_gdf['gml_id'] == neighbor['gml_id_road']].geometry.iloc[0])
-        if intersection.length >= min_road_length:
-            valid_neighbors.append(neighbor)
+    def road_geometry(self, gml_id):
+        """Geometry of the first road with this gml_id"""
+        return self.road_geometries[self.road_positions[self.road_ids.get_loc(gml_id)]]
     
-    if not valid_neighbors:
-        return gpd.GeoDataFrame(columns=road_neighbors.columns, crs=road_neighbors.crs)
+    def road_neighbor_positions(self, site_polygon, neighbor_idx: Optional[np.ndarray] = None
+                                ) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions of the neighboring plots with at least MIN_ROAD_FRONTAGE of road and of that road
+        
+        The touching plots are looked up in the plot index unless their sorted positions are given.
+        """
+        if neighbor_idx is None:
+            neighbor_idx = np.sort(self.plots.sindex.query(site_polygon, predicate='touches'))
+        # Pairs in the order gpd.sjoin yields them: by neighbor, then in road index order
+        pair_neighbor, pair_road = self.roads.sindex.query(self.plot_geometries[neighbor_idx], predicate='intersects',
+                                                           sort=False)
+        order = np.argsort(pair_neighbor, kind='stable')
+        plot_positions = neighbor_idx[pair_neighbor[order]]
+        road_positions = pair_road[order]
+        
+        # Frontage of every neighbor/road pair at once
+        frontage_roads = self.road_positions[self.road_ids.get_indexer(self.roads['gml_id'].to_numpy()[road_positions])]
+        lengths = shapely.length(shapely.intersection(self.plot_geometries[plot_positions],
+                                                      self.road_geometries[frontage_roads]))
+        plot_positions, road_positions = plot_positions[lengths >= MIN_ROAD_FRONTAGE], road_positions[lengths >= MIN_ROAD_FRONTAGE]
+        
+        # Drop duplicates and apply size filter
+        keep = (~pd.Series(self.plots['gml_id'].to_numpy()[plot_positions]).duplicated().to_numpy() &
+                (shapely.area(self.plot_geometries[plot_positions]) <= MAX_ROAD_NEIGHBOR_AREA))
+        return plot_positions[keep], road_positions[keep]
     
-    # Create GeoDataFrame from valid neighbors
-    valid_road_neighbors = gpd.GeoDataFrame(valid_neighbors, crs=road_neighbors.crs)
+    def road_neighbors(self, site_polygon) -> gpd.GeoDataFrame:
+        """Neighboring plots with at least MIN_ROAD_FRONTAGE of road, as get_road_neighbors returns them"""
+        return _sjoin_layout(self.plots, self.roads, *self.road_neighbor_positions(site_polygon))
     
-    # Drop duplicates and apply size filter
-    unique_road_neighbors = valid_road_neighbors.drop_duplicates(subset='gml_id_neighbor')
-    max_plot_area = 10000
-    unique_road_neighbors = unique_road_neighbors[unique_road_neighbors.area <= max_plot_area]
+    def road_sides(self, plot_geom, road_geoms, buffer_distance: float = ROAD_SIDE_BUFFER) -> List[Optional[LineString]]:
+        """Road-facing side of a plot towards each road geometry, as get_road_side determines it"""
+        sides = shapely.intersection(plot_geom.boundary, shapely.buffer(np.asarray(road_geoms), buffer_distance))
+        road_sides = []
+        for road_side in sides:
+            if road_side.geom_type == 'MultiLineString':
+                road_side = max(road_side.geoms, key=lambda x: x.length)
+            if road_side.is_empty or road_side.length < 0.01:
+                print(f"Warning: Invalid road side found (length={road_side.length:.2f}m)")
+                road_side = None
+            road_sides.append(road_side)
+        return road_sides
     
-    return unique_road_neighbors
+    def road_side(self, plot_geom, road_geom, buffer_distance: float = ROAD_SIDE_BUFFER) -> Optional[LineString]:
+        """Road-facing side of a plot towards one road"""
+        return self.road_sides(plot_geom, [road_geom], buffer_distance)[0]
+    
+    def access_road(self, site_geom, road_neighbors: gpd.GeoDataFrame) -> Optional[pd.Series]:
+        """Road neighbor sharing the longest road side with the site, as get_access_road selects it"""
+        access_index = self._access_index(site_geom, road_neighbors.geometry.values)
+        return road_neighbors.iloc[access_index] if access_index >= 0 else None
+    
+    def _access_index(self, site_geom, neighbor_geoms) -> int:
+        """Index of the neighbor sharing the longest road side with the site (-1 when none)"""
+        road_sides = self.road_sides(site_geom, neighbor_geoms)
+        lengths = np.array([road_side.length if road_side is not None else 0.0 for road_side in road_sides])
+        if not len(lengths) or lengths.max() <= 0:
+            return -1
+        return int(np.argmax(lengths))
+    
+    def resolve(self, plot_geom, plot_id, topology: Optional[PlotTopology] = None,
+                position: Optional[int] = None) -> RoadAccess:
+        """Road neighbors, access road, road side and frontage length of a plot, memoized per plot
+        
+        The plot's position in the plot layer is looked up from its geometry unless given.
+        """
+        key = self.cache_key(plot_geom, plot_id, topology, position)
+        resolved = self.cache.get(*key)
+        if resolved is None:
+            resolved = self._resolve(plot_geom, topology)
+            self.cache.put(*key, resolved)
+        return resolved
+    
+    def _resolve(self, plot_geom, topology: Optional[PlotTopology]) -> RoadAccess:
+        plot_positions, road_positions = _road_neighbor_positions(plot_geom, self.plots, self.roads, topology, self)
+        resolved = RoadAccess(plot_positions, road_positions)
+        if not resolved.has_road_neighbors:
+            return resolved
+        
+        road_neighbors = self.road_neighbor_frame(resolved)
+        site_position = topology.locate(plot_geom) if topology is not None else None
+        if site_position is None:
+            resolved.access_index = self._access_index(plot_geom, road_neighbors.geometry.values)
+        else:
+            access_road = get_access_road(plot_geom, road_neighbors, topology)
+            if access_road is not None:
+                resolved.access_index = road_neighbors.index.get_loc(access_road.name)
+        if not resolved.has_access_road:
+            return resolved
+        
+        access_road = road_neighbors.iloc[resolved.access_index]
+        resolved.road_side = self.road_side(plot_geom, access_road.geometry)
+        if resolved.road_side is None:
+            return resolved
+        # Without a topology the frontage is measured along the same road side
+        resolved.frontage_length = (get_frontage_length(plot_geom, access_road, topology) if site_position is not None
+                                    else resolved.road_side.length)
+        return resolved
+    
+    def access_road_id(self, resolved: RoadAccess):
+        """gml_id of the access road plot's road, None when no access road was found"""
+        if not resolved.has_access_road:
+            return None
+        return self.roads['gml_id'].iat[resolved.road_positions[resolved.access_index]]
+    
+    def road_neighbor_frame(self, resolved: RoadAccess) -> gpd.GeoDataFrame:
+        """Road neighbors of a resolved plot, as get_road_neighbors returns them"""
+        return _sjoin_layout(self.plots, self.roads, resolved.plot_positions, resolved.road_positions)
+    
+    def access_road_row(self, resolved: RoadAccess) -> Optional[pd.Series]:
+        """Access road of a resolved plot, as get_access_road returns it"""
+        if not resolved.has_access_road:
+            return None
+        i = resolved.access_index
+        return _sjoin_layout(self.plots, self.roads, resolved.plot_positions[i:i + 1],
+                             resolved.road_positions[i:i + 1]).iloc[0]
 
-def get_road_side(plot_geom, road_geom, buffer_distance=0.1) -> Optional[LineString]:
+def get_road_side(plot_geom, road_geom, buffer_distance=ROAD_SIDE_BUFFER) -> Optional[LineString]:
     """Get the road-facing side of a plot."""
     # Create a small buffer around the road polygon
     road_buffer = road_geom.buffer(buffer_distance)
@@ -63,13 +283,17 @@ def get_road_side(plot_geom, road_geom, buffer_distance=0.1) -> Optional[LineStr
         
     return road_side
 
-def get_access_road(site_geom, road_neighbors: gpd.GeoDataFrame) -> Optional[gpd.GeoSeries]:
+def get_access_road(site_geom, road_neighbors: gpd.GeoDataFrame, topology: Optional[PlotTopology] = None,
+                    road_access: Optional[RoadAccessService] = None) -> Optional[gpd.GeoSeries]:
     """Get the access road of the plot defined as the road plot with the longest common boundary."""
     longest_boundary = 0
     site_access_road = None
-    
-    for _, road in road_neighbors.iterrows():
-        road_side = get_road_side(site_geom, road.geometry)
+    site_position = topology.locate(site_geom) if topology is not None else None
+    if site_position is None and road_access is not None:
+        return road_access.access_road(site_geom, road_neighbors)
+
+    for label, road in road_neighbors.iterrows():
+        road_side = _get_shared_side(site_geom, site_position, label, road.geometry, topology)
         if road_side is not None:  # Only process valid road sides
             boundary_length = road_side.length
             if boundary_length > longest_boundary:
@@ -78,11 +302,23 @@ def get_access_road(site_geom, road_neighbors: gpd.GeoDataFrame) -> Optional[gpd
     
     return site_access_road
 
-def get_frontage_length(plot_polygon, site_access_road) -> float:
+def get_frontage_length(plot_polygon, site_access_road, topology: Optional[PlotTopology] = None) -> float:
     """Get the frontage length of the site from the access road."""
-    site_access_road_side = get_road_side(plot_polygon, site_access_road.geometry)
+    site_position = topology.locate(plot_polygon) if topology is not None else None
+    site_access_road_side = _get_shared_side(
+        plot_polygon, site_position, site_access_road.name, site_access_road.geometry, topology
+    )
     return site_access_road_side.length if site_access_road_side else 0.0
 
+def _get_shared_side(plot_geom, plot_position: Optional[int], neighbor_label, neighbor_geom,
+                     topology: Optional[PlotTopology]) -> Optional[LineString]:
+    """Road side of a plot facing a neighboring plot, looked up in the topology when both are indexed."""
+    if plot_position is not None and topology.tolerance == ROAD_SIDE_BUFFER:
+        neighbor_position = topology.positions([neighbor_label])[0]
+        if neighbor_position >= 0 and topology.geometries[neighbor_position].equals(neighbor_geom):
+            return topology.shared_edge(plot_position, neighbor_position)
+    return get_road_side(plot_geom, neighbor_geom)
+
 def extend_line(line: LineString, distance: float = 20) -> LineString:
     """Extend a LineString in both directions."""
     # Get coordinates of the line
@@ -113,9 +349,10 @@ def extend_line(line: LineString, distance: float = 20) -> LineString:
     
     return LineString([new_start, coords[0], coords[-1], new_end])
 
-def get_building_front_elevation(building_geom, road_side: LineString) -> LineString:
+def get_building_front_elevation(building_geom, road_side: LineString, verbose: bool = True) -> LineString:
     """Get the width of building front by projecting onto road side line."""
-    print(f"  Road side length: {road_side.length:.1f}m")
+    if verbose:
+        print(f"  Road side length: {road_side.length:.1f}m")
     
     # Handle MultiLineString by getting all coordinates
     if road_side.geom_type == 'MultiLineString':
@@ -125,7 +362,8 @@ def get_building_front_elevation(building_geom, road_side: LineString) -> LineSt
             all_coords.extend(list(line.coords))
         # Create a simplified line using first and last points
         simplified_road_side = LineString([all_coords[0], all_coords[-1]])
-        print("  Converted MultiLineString to LineString")
+        if verbose:
+            print("  Converted MultiLineString to LineString")
     else:
         # If it's already a LineString, just use its endpoints
         coords = list(road_side.coords)
@@ -133,11 +371,13 @@ def get_building_front_elevation(building_geom, road_side: LineString) -> LineSt
     
     # Extend the road side line to ensure proper projections
     extended_road_side = extend_line(simplified_road_side, distance=100)
-    print(f"  Extended road side length: {extended_road_side.length:.1f}m")
+    if verbose:
+        print(f"  Extended road side length: {extended_road_side.length:.1f}m")
     
     # Get all vertices of the building polygon
     vertices = list(building_geom.exterior.coords)
-    print(f"  Building vertices: {len(vertices)}")
+    if verbose:
+        print(f"  Building vertices: {len(vertices)}")
     
     # Project each vertex onto the extended road side and get their distances
     projections = []
@@ -154,10 +394,12 @@ def get_building_front_elevation(building_geom, road_side: LineString) -> LineSt
         if dist_to_line <= 50:
             projections.append(proj_dist)
     
-    print(f"  Valid projections: {len(projections)}")
+    if verbose:
+        print(f"  Valid projections: {len(projections)}")
     
     if not projections:  # If no valid projections found
-        print("  No valid projections found")
+        if verbose:
+            print("  No valid projections found")
         return LineString()  # Return empty line
         
     # Get the min and max projections to find the extent
@@ -170,9 +412,66 @@ def get_building_front_elevation(building_geom, road_side: LineString) -> LineSt
     
     # Create the front elevation line
     result = LineString([point_start, point_end])
-    print(f"  Resulting front elevation length: {result.length:.1f}m")
+    if verbose:
+        print(f"  Resulting front elevation length: {result.length:.1f}m")
     return result
 
+def front_elevation_widths(building_geoms, road_sides, distance: float = 100, max_offset: float = 50) -> np.ndarray:
+    """Front elevation widths of buildings, the lengths of get_building_front_elevation(building, road_side).
+    
+    road_sides holds the road side of each building, or one road side for all. The vertices of all
+    buildings are projected at once onto the line through the first and last point of their road
+    side, extended by `distance` at both ends; vertices farther than `max_offset` from it are ignored.
+    """
+    building_geoms = np.asarray(building_geoms, dtype=object)
+    road_sides = np.broadcast_to(np.asarray(road_sides, dtype=object), building_geoms.shape)
+    widths = np.zeros(len(building_geoms))
+    
+    # Multi-part buildings and unusual road sides go through the scalar function
+    simple = ((shapely.get_type_id(building_geoms) == 3) &
+              np.isin(shapely.get_type_id(road_sides), [1, 5]) & ~shapely.is_empty(road_sides))
+    for i in np.flatnonzero(~simple):
+        widths[i] = get_building_front_elevation(building_geoms[i], road_sides[i], verbose=False).length
+    idx = np.flatnonzero(simple)
+    if not len(idx):
+        return widths
+    
+    # Road side direction from its first to its last point, extended at both ends
+    coords, part = shapely.get_coordinates(road_sides[idx], return_index=True)
+    p1 = coords[np.searchsorted(part, np.arange(len(idx)))]
+    p2 = coords[np.searchsorted(part, np.arange(len(idx)), side='right') - 1]
+    length = np.hypot(*(p2 - p1).T)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        unit = (p2 - p1) / length[:, None]
+        line_start = p1 - unit * distance
+        line_length = length + 2 * distance
+        
+        # Project every vertex onto its building's line, clamped to the line's ends
+        vertices, owner = shapely.get_coordinates(shapely.get_exterior_ring(building_geoms[idx]), return_index=True)
+        along = np.clip(np.einsum('ij,ij->i', vertices - line_start[owner], unit[owner]), 0, line_length[owner])
+        offsets = np.hypot(*(vertices - line_start[owner] - unit[owner] * along[:, None]).T)
+    near = offsets <= max_offset
+    
+    lowest = np.full(len(idx), np.inf)
+    highest = np.full(len(idx), -np.inf)
+    np.minimum.at(lowest, owner[near], along[near])
+    np.maximum.at(highest, owner[near], along[near])
+    result = np.where(np.isfinite(lowest), highest - lowest, 0.0)
+    # A zero-length road side is not extended and projects every vertex onto its single point
+    result[length == 0] = 0.0
+    widths[idx] = result
+    return widths
+
+def _single_buildings(building_geoms: np.ndarray) -> np.ndarray:
+    """Buildings as the neighborhood analysis measures them: each geometry unioned with itself
+    
+    A union leaves the vertices of a valid polygon in place, so only other geometries are unioned.
+    """
+    building_geoms = np.array(building_geoms, dtype=object)
+    needs_union = ~(shapely.is_valid(building_geoms) & (shapely.get_type_id(building_geoms) == 3))
+    building_geoms[needs_union] = [shapely.union_all(geom) for geom in building_geoms[needs_union]]
+    return building_geoms
+
 def translate_points(points: List[Tuple[float, float]], dx: float, dy: float) -> List[Tuple[float, float]]:
     """Translate a list of points by dx and dy."""
     return [(x + dx, y + dy) for x, y in points]
@@ -182,13 +481,195 @@ def get_translation_offset(geometry) -> Tuple[float, float]:
     bounds = geometry.bounds  # Returns (minx, miny, maxx, maxy)
     return -bounds[0], -bounds[1]
 
+def assign_buildings(plots: gpd.GeoDataFrame, buildings: gpd.GeoDataFrame) -> pd.DataFrame:
+    """Pairs of (plot position, building position) with the building centroid on the plot, in plot order."""
+    # A centroid lies within its building's bounding box, so the bounding-box query finds every candidate pair
+    plot_geoms = np.asarray(plots.geometry.values)
+    plot_idx, building_idx = buildings.sindex.query(plot_geoms)
+    unique_buildings, inverse = np.unique(building_idx, return_inverse=True)
+    centroids = shapely.centroid(np.asarray(buildings.geometry.values[unique_buildings]))[inverse]
+    on_plot = shapely.intersects(plot_geoms[plot_idx], centroids)
+    return pd.DataFrame({
+        'plot': plot_idx[on_plot],
+        'plot_id': plots['gml_id'].to_numpy()[plot_idx[on_plot]],
+        'building': building_idx[on_plot]
+    })
+
+def built_up_plot_metrics(plots_gdf: gpd.GeoDataFrame, roads_gdf: gpd.GeoDataFrame, buildings_gdf: gpd.GeoDataFrame,
+                          positions: Optional[np.ndarray] = None, topology: Optional[PlotTopology] = None,
+                          verbose: bool = True, road_access: Optional[RoadAccessService] = None,
+                          building_assignment: Optional[BuildingAssignment] = None) -> gpd.GeoDataFrame:
+    """Site-independent metrics of the built-up plots at the given positions (all plots by default).
+    
+    Plots sharing a gml_id are reported once, with the buildings of all of them. Plots whose
+    access road or road side cannot be determined are left out. Height and setback are reported
+    for every plot; the site analysis only uses them for adjacent plots. Buildings are taken
+    from a precomputed BuildingAssignment of the same layers when one is given.
+    """
+    if road_access is None or not road_access.covers(plots_gdf, roads_gdf):
+        road_access = RoadAccessService.shared(plots_gdf, roads_gdf)
+    analyzed_plots = plots_gdf if positions is None else plots_gdf.iloc[positions]
+    if building_assignment is not None and building_assignment.covers(plots_gdf, buildings_gdf):
+        assignment = building_assignment.pairs(positions)
+    else:
+        assignment = assign_buildings(analyzed_plots, buildings_gdf)
+    
+    # Plots sharing a gml_id are analyzed as one plot with the buildings of all of them
+    built_up = assignment[['plot_id', 'plot']].drop_duplicates().sort_values('plot', kind='stable')
+    assignment = assignment.drop_duplicates(subset=['plot_id', 'building'])
+    
+    # BCR and FAR from groupby aggregates over the assignment
+    building_geoms = buildings_gdf.geometry.values
+    footprints = shapely.area(np.asarray(building_geoms[assignment['building'].to_numpy()]))
+    floors = buildings_gdf['LICZBA_KONDYGNACJI'].to_numpy()[assignment['building'].to_numpy()]
+    assignment = assignment.assign(footprint=footprints, gross_floor_area=footprints * floors)
+    per_plot = assignment.groupby('plot_id', sort=False).agg(
+        footprint=('footprint', 'sum'),
+        gross_floor_area=('gross_floor_area', 'sum')
+    )
+    
+    # Road side of every plot id (memoized in the road access cache), on the geometry of its first
+    # plot whose road side can be resolved (its first plot when none can)
+    analyzed_geoms = np.asarray(analyzed_plots.geometry.values)
+    analyzed_positions = np.arange(len(plots_gdf)) if positions is None else np.asarray(positions)
+    plot_of_id, resolved_of_id = {}, {}
+    for plot_id, plot in zip(built_up['plot_id'].to_numpy(), built_up['plot'].to_numpy()):
+        previous = resolved_of_id.get(plot_id)
+        if previous is not None and previous.road_side is not None:
+            continue
+        plot_road_access = road_access.resolve(analyzed_geoms[plot], plot_id, topology, analyzed_positions[plot])
+        if previous is None or plot_road_access.road_side is not None:
+            plot_of_id[plot_id], resolved_of_id[plot_id] = plot, plot_road_access
+    resolved = [resolved_of_id[plot_id] for plot_id in per_plot.index]
+    plot_geoms = analyzed_geoms[[plot_of_id[plot_id] for plot_id in per_plot.index]]
+    plot_areas = shapely.area(plot_geoms)
+    per_plot['building_coverage_ratio'] = per_plot['footprint'].to_numpy() / plot_areas
+    per_plot['floor_area_ratio'] = per_plot['gross_floor_area'].to_numpy() / plot_areas
+    road_sides = np.array([plot_road_access.road_side for plot_road_access in resolved], dtype=object)
+    has_road_side = np.array([road_side is not None for road_side in road_sides], dtype=bool)
+    
+    # Front elevation width, height and setback of all buildings of plots with a road side at once
+    plot_rows = pd.Series(np.arange(len(per_plot)), index=per_plot.index)[assignment['plot_id']].to_numpy()
+    measured = assignment[has_road_side[plot_rows]]
+    plot_rows = plot_rows[has_road_side[plot_rows]]
+    buildings = measured['building'].to_numpy()
+    measured_geoms = np.asarray(building_geoms[buildings])
+    measured = measured.assign(
+        front_elevation_width=front_elevation_widths(_single_buildings(measured_geoms), road_sides[plot_rows]),
+        building_height=buildings_gdf['WYSOKOSC'].to_numpy()[buildings],
+        setback=shapely.distance(measured_geoms, road_sides[plot_rows])
+    )
+    per_building = measured.groupby('plot_id', sort=False).agg(
+        buildings=('building', 'size'),
+        front_elevation_width=('front_elevation_width', 'max'),
+        building_height=('building_height', 'max'),
+        setback=('setback', 'min')
+    ).reindex(per_plot.index[has_road_side])
+    
+    if verbose:
+        for plot_id, row in per_building.iterrows():
+            print(f"Plot {plot_id}: {int(row['buildings'])} buildings, longest front elevation {row['front_elevation_width']:.1f}m")
+    
+    metrics = pd.DataFrame({
+        'plot_id': per_building.index.to_numpy(),
+        'building_coverage_ratio': per_plot['building_coverage_ratio'].to_numpy()[has_road_side],
+        'floor_area_ratio': per_plot['floor_area_ratio'].to_numpy()[has_road_side],
+        'front_elevation_width': per_building['front_elevation_width'].to_numpy(),
+        'building_height': per_building['building_height'].to_numpy(),
+        'setback': per_building['setback'].to_numpy(),
+        'access_road_id': [road_access.access_road_id(plot_road_access)
+                           for plot_road_access, valid in zip(resolved, has_road_side) if valid],
+        'road_side': gpd.GeoSeries(road_sides[has_road_side], crs=plots_gdf.crs),
+        'geometry': plot_geoms[has_road_side]
+    }, columns=BUILT_UP_PLOT_COLUMNS)
+    return gpd.GeoDataFrame(metrics, geometry='geometry', crs=plots_gdf.crs)
+
+class PlotMetricsTable:
+    """Materialized metrics of every built-up plot of a city, queried by radius around a site
+    
+    BCR, FAR, front elevation width, height, setback, access road and road side do not depend
+    on the analyzed site, so they are computed once per plot and stored with the plot geometry.
+    Site analysis then becomes a spatial query plus aggregation; only adjacency to the site is
+    evaluated per analysis. Tables are persisted as GeoParquet keyed by the input layers.
+    Plots sharing a gml_id are combined over the whole city, not only within the analysis area.
+    """
+    
+    def __init__(self, table: gpd.GeoDataFrame):
+        self.table = table.reset_index(drop=True)
+    
+    def __len__(self) -> int:
+        return len(self.table)
+    
+    @classmethod
+    def build(cls, plots_gdf: gpd.GeoDataFrame, roads_gdf: gpd.GeoDataFrame, buildings_gdf: gpd.GeoDataFrame,
+              topology: Optional[PlotTopology] = None,
+              building_assignment: Optional[BuildingAssignment] = None) -> 'PlotMetricsTable':
+        """Compute the metrics of all built-up plots, with road lookups in the topology when it covers the layers"""
+        start = time.perf_counter()
+        if not _covers(topology, plots_gdf, roads_gdf):
+            topology = None
+        table = cls(built_up_plot_metrics(plots_gdf, roads_gdf, buildings_gdf, topology=topology, verbose=False,
+                                          building_assignment=building_assignment))
+        print(f"Computed metrics of {len(table)} built-up plots in {time.perf_counter() - start:.1f}s")
+        return table
+    
+    @classmethod
+    def load(cls, path: str) -> 'PlotMetricsTable':
+        return cls(gpd.read_parquet(path))
+    
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.table.to_parquet(path, index=False)
+    
+    @classmethod
+    def load_or_build(cls, plots_gdf: gpd.GeoDataFrame, roads_gdf: gpd.GeoDataFrame, buildings_gdf: gpd.GeoDataFrame,
+                      cache_dir: str = 'output/cache', topology: Optional[PlotTopology] = None,
+                      building_assignment: Optional[BuildingAssignment] = None) -> 'PlotMetricsTable':
+        """Load the table computed from these layers, building and saving it on first use
+        
+        Tables are keyed by the layers, the road access parameters, the road lookup path and
+        PLOT_METRICS_VERSION.
+        """
+        parts = [layer_fingerprint(gdf) for gdf in (plots_gdf, roads_gdf, buildings_gdf)]
+        parts.append(f"{PLOT_METRICS_VERSION}|{MIN_ROAD_FRONTAGE}|{MAX_ROAD_NEIGHBOR_AREA}|{ROAD_SIDE_BUFFER}")
+        parts.append(f"topology|{topology.tolerance}|{topology.snap_gaps}" if _covers(topology, plots_gdf, roads_gdf)
+                     else 'geometric')
+        key = hashlib.sha256('|'.join(parts).encode()).hexdigest()[:16]
+        path = os.path.join(cache_dir, f"plot_metrics-{key}.parquet")
+        if os.path.exists(path):
+            return cls.load(path)
+        table = cls.build(plots_gdf, roads_gdf, buildings_gdf, topology, building_assignment)
+        table.save(path)
+        print(f"Plot metrics table saved to: {path}")
+        return table
+    
+    def query(self, area) -> gpd.GeoDataFrame:
+        """Built-up plots intersecting an area, in plot order"""
+        return semi_join(self.table, gpd.GeoDataFrame(geometry=[area], crs=self.table.crs))
+
 class DevelopmentConditions:
-    def __init__(self, site_candidate, plots_gdf: gpd.GeoDataFrame, roads_gdf: gpd.GeoDataFrame, buildings_gdf: gpd.GeoDataFrame):
-        """Initialize with the selected site and required GIS data."""
+    def __init__(self, site_candidate, plots_gdf: gpd.GeoDataFrame, roads_gdf: gpd.GeoDataFrame, buildings_gdf: gpd.GeoDataFrame,
+                 topology: Optional[PlotTopology] = None, metrics_table: Optional[PlotMetricsTable] = None,
+                 road_access: Optional[RoadAccessService] = None,
+                 building_assignment: Optional[BuildingAssignment] = None, verbose: bool = True):
+        """Initialize with the selected site and required GIS data.
+        
+        A PlotTopology built from the same plots and roads turns road access lookups into index lookups;
+        a PlotMetricsTable of the same layers replaces the per-site neighborhood computation. A
+        RoadAccessService and a BuildingAssignment over the same layers can be shared between analyses.
+        With verbose, the neighborhood analysis prints a line per built-up plot.
+        """
         self.site = site_candidate
         self.plots = plots_gdf
         self.roads = roads_gdf
         self.buildings = buildings_gdf
+        self.topology = topology
+        self.metrics_table = metrics_table
+        self.building_assignment = building_assignment
+        self.verbose = verbose
+        if road_access is None or not road_access.covers(plots_gdf, roads_gdf):
+            road_access = RoadAccessService.shared(plots_gdf, roads_gdf)
+        self.road_access = road_access
         self.analysis_radius = None
         self.road_neighbors = None
         self.access_road = None
@@ -198,21 +679,22 @@ class DevelopmentConditions:
         
     def analyze(self) -> Dict:
         """Analyze development conditions for the site."""
-        # Get road access information
-        self.road_neighbors = get_road_neighbors(self.site.geometry, self.plots, self.roads)
+        # Get road access information (memoized per plot across analyses)
+        road_access = self.road_access.resolve(self.site.geometry, self.site_id(), self.topology)
+        self.road_neighbors = self.road_access.road_neighbor_frame(road_access)
         if self.road_neighbors.empty:
             raise ValueError("Site has no valid road access")
             
-        self.access_road = get_access_road(self.site.geometry, self.road_neighbors)
+        self.access_road = self.road_access.access_road_row(road_access)
         if self.access_road is None:
             raise ValueError("Could not determine site access road")
             
-        self.road_side = get_road_side(self.site.geometry, self.access_road.geometry)
+        self.road_side = road_access.road_side
         if self.road_side is None:
             raise ValueError("Could not determine road-facing side of the site")
             
-        self.frontage_length = get_frontage_length(self.site.geometry, self.access_road)
-        self.analysis_radius = max(50, min(3 * self.frontage_length, 200))
+        self.frontage_length = road_access.frontage_length
+        self.analysis_radius = max(MIN_ANALYSIS_RADIUS, min(3 * self.frontage_length, MAX_ANALYSIS_RADIUS))
         
         # Analyze built-up plots in the area
         self.plot_metrics = self._analyze_neighborhood()
@@ -223,97 +705,31 @@ class DevelopmentConditions:
         return conditions
     
     def _analyze_neighborhood(self) -> pd.DataFrame:
-        """Analyze built-up plots in the analysis area."""
-        # Create analysis area
-        analysis_area = gpd.GeoSeries([self.site.geometry]).buffer(self.analysis_radius)
-        
-        # Find plots in the analysis area
-        analyzed_plots = self.plots[self.plots.geometry.intersects(analysis_area.iloc[0])]
-        
-        # Prepare building centroids for spatial join
-        self.buildings['centroid'] = self.buildings.centroid
-        building_centroids = self.buildings.set_geometry('centroid', inplace=False).set_crs(self.buildings.crs)
-        
-        # Find built-up plots
-        built_up_plots = gpd.sjoin(analyzed_plots, building_centroids, how='inner', 
-                                  predicate='intersects', lsuffix='plot', rsuffix='building')
-        
-        plot_metrics = []
-        
-        for _, plot in built_up_plots.iterrows():
-            plot_area = plot.geometry.area
-            
-            # Get buildings on this plot
-            plot_buildings = self.buildings[self.buildings['GID'].isin(
-                built_up_plots[built_up_plots['gml_id'] == plot['gml_id']]['GID']
-            )]
-            
-            # Skip if no buildings found
-            if plot_buildings.empty:
-                continue
-            
-            # Calculate metrics
-            bcr = plot_buildings.geometry.area.sum() / plot_area
-            
-            # Floor area ratio
-            building_footprint = plot_buildings.geometry.area
-            floors = plot_buildings['LICZBA_KONDYGNACJI']
-            gross_floor_area = building_footprint * floors
-            far = gross_floor_area.sum() / plot_area
-            
-            # Front width
-            plot_road_neighbors = get_road_neighbors(plot.geometry, self.plots, self.roads)
-            if plot_road_neighbors.empty:
-                continue
-                
-            plot_access_road = get_access_road(plot.geometry, plot_road_neighbors)
-            if plot_access_road is None:
-                continue
-                
-            plot_road_side = get_road_side(plot.geometry, plot_access_road.geometry)
-            if plot_road_side is None:
-                continue
-            
-            # Process buildings for front elevation
-            plot_front_elevations = []
-            print(f"\nProcessing buildings for plot {plot['gml_id']}:")
-            for _, building in plot_buildings.iterrows():
-                building_processed = gpd.GeoSeries(building.geometry).union_all()
-                front_elevation = get_building_front_elevation(building_processed, plot_road_side)
-                print(f"  Building elevation length: {front_elevation.length:.1f}m")
-                plot_front_elevations.append(front_elevation)
-            
-            # Get the longest front elevation
-            if plot_front_elevations:
-                longest_elevation = max(plot_front_elevations, key=lambda x: x.length)
-                front_elevation_width = longest_elevation.length
-                print(f"  Selected longest elevation: {front_elevation_width:.1f}m")
-            else:
-                front_elevation_width = 0
-                print("  No valid front elevations found")
-            
-            # Check if plot is adjacent to the site and on the same access road
-            adjacent = (plot.geometry.touches(self.site.geometry) and 
-                       plot.geometry.touches(self.access_road.geometry))
-            
-            if adjacent:
-                building_height = plot_buildings['WYSOKOSC'].max()
-                setback = plot_buildings.geometry.distance(plot_road_side).min()
-            else:
-                building_height = None
-                setback = None
-            
-            plot_metrics.append({
-                'plot_id': plot['gml_id'],
-                'building_coverage_ratio': bcr,
-                'floor_area_ratio': far,
-                'front_elevation_width': front_elevation_width,
-                'adjacent': adjacent,
-                'building_height': building_height,
-                'setback': setback
-            })
-        
-        return pd.DataFrame(plot_metrics).drop_duplicates(subset='plot_id')
+        """Analyze built-up plots in the analysis area, from the metrics table when one is given."""
+        # Find built-up plots in the analysis area
+        analysis_area = self.site.geometry.buffer(self.analysis_radius)
+        if self.metrics_table is not None:
+            metrics = self.metrics_table.query(analysis_area)
+        else:
+            area = gpd.GeoDataFrame(geometry=[analysis_area], crs=self.plots.crs)
+            positions = np.flatnonzero(semi_join_mask(self.plots, area))
+            metrics = built_up_plot_metrics(self.plots, self.roads, self.buildings, positions, self.topology,
+                                            verbose=self.verbose, road_access=self.road_access,
+                                            building_assignment=self.building_assignment)
+        
+        # Plots adjacent to the site and on the same access road; height and setback are only taken from these
+        plot_geoms = np.asarray(metrics.geometry.values)
+        adjacent = (shapely.touches(plot_geoms, self.site.geometry) &
+                    shapely.touches(plot_geoms, self.access_road.geometry))
+        return pd.DataFrame({
+            'plot_id': metrics['plot_id'].to_numpy(),
+            'building_coverage_ratio': metrics['building_coverage_ratio'].to_numpy(dtype=float),
+            'floor_area_ratio': metrics['floor_area_ratio'].to_numpy(dtype=float),
+            'front_elevation_width': metrics['front_elevation_width'].to_numpy(dtype=float),
+            'adjacent': adjacent,
+            'building_height': np.where(adjacent, metrics['building_height'].to_numpy(dtype=float), np.nan),
+            'setback': np.where(adjacent, metrics['setback'].to_numpy(dtype=float), np.nan)
+        }, columns=PLOT_METRIC_COLUMNS)
     
     def _calculate_zoning_conditions(self) -> Dict:
         """Calculate zoning conditions based on neighborhood analysis."""
@@ -348,19 +764,22 @@ class DevelopmentConditions:
         }
     
     def visualize(self, show_metrics: bool = True):
-        """Visualize development conditions analysis."""
+        """Visualize development conditions analysis (saved to a file in headless mode, see app.figures)."""
         if self.plot_metrics is None:
             raise ValueError("Must run analyze() before visualization")
+        plt = figures.pyplot()
+        ctx = figures.contextily()
             
         # Create analysis area
-        analysis_area = gpd.GeoSeries([self.site.geometry]).buffer(self.analysis_radius)
+        analysis_area = gpd.GeoDataFrame(geometry=[self.site.geometry.buffer(self.analysis_radius)], crs=self.plots.crs)
         
         # Get built-up plots
-        analyzed_plots = self.plots[self.plots.geometry.intersects(analysis_area.iloc[0])]
-        self.buildings['centroid'] = self.buildings.centroid
-        building_centroids = self.buildings.set_geometry('centroid', inplace=False).set_crs(self.buildings.crs)
-        built_up_plots = gpd.sjoin(analyzed_plots, building_centroids, how='inner', 
-                                  predicate='intersects', lsuffix='plot', rsuffix='building')
+        positions = np.flatnonzero(semi_join_mask(self.plots, analysis_area))
+        if self.building_assignment is not None and self.building_assignment.covers(self.plots, self.buildings):
+            built_up_plots = self.plots.iloc[positions[self.building_assignment.is_built_up(positions)]]
+        else:
+            building_centroids = gpd.GeoDataFrame(geometry=self.buildings.centroid)
+            built_up_plots = semi_join(self.plots.iloc[positions], building_centroids)
         
         # Create visualization
         fig, ax = plt.subplots(figsize=(12, 8))
@@ -438,12 +857,22 @@ class DevelopmentConditions:
         
         ctx.add_basemap(ax, crs=self.plots.crs)
         ax.set_axis_off()
-        plt.show() 
+        figures.show(fig, f"site_{self.site_id()}_conditions")
+    
+    def site_id(self) -> str:
+        """Identifier of the site, for a SiteCandidate or a plot row"""
+        plot_id = getattr(self.site, 'plot_id', None)
+        return str(plot_id if plot_id is not None else self.site['gml_id'])
     
     def export_to_dxf(self, filename: str):
         """Export site and development conditions to DXF format."""
         if not hasattr(self, 'plot_metrics'):
             raise ValueError("Must run analyze() before exporting to DXF")
+        # DXF support is only loaded for exports
+        import ezdxf
+        from ezdxf.enums import TextEntityAlignment
+        from ezdxf.addons import text2path
+        from ezdxf.addons.text2path import Kind  # Import Kind enum
         
         # Create new DXF document
         doc = ezdxf.new("R2000")
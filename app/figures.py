@@ -0,0 +1,49 @@
+"""Lazily loaded plotting back end shared by the visualizations.
+
+matplotlib and contextily are imported on first use, so searches and batch jobs that never
+render do not pay for them. In headless mode figures are written to image files instead of
+being shown, using the non-interactive Agg back end.
+"""
+import os
+import re
+from typing import Optional
+
+# Directory figures are saved to in headless mode (None shows them interactively)
+_headless_dir: Optional[str] = None
+
+def set_headless(output_dir: Optional[str] = 'output/figures'):
+    """Save figures to output_dir instead of showing them; None switches back to interactive display"""
+    global _headless_dir
+    _headless_dir = output_dir
+    if output_dir is not None:
+        import matplotlib
+        matplotlib.use('Agg')
+
+def is_headless() -> bool:
+    return _headless_dir is not None
+
+def pyplot():
+    """Return matplotlib.pyplot, importing it on first use"""
+    if is_headless():
+        import matplotlib
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def contextily():
+    """Return the contextily module, importing it on first use"""
+    import contextily as ctx
+    return ctx
+
+def show(fig, name: str) -> Optional[str]:
+    """Show a finished figure, or save it as <name>.png in headless mode and return the path"""
+    plt = pyplot()
+    if not is_headless():
+        plt.show()
+        return None
+    os.makedirs(_headless_dir, exist_ok=True)
+    path = os.path.join(_headless_dir, re.sub(r'[^\w.-]+', '_', name) + '.png')
+    fig.savefig(path, dpi=150, bbox_inches='tight')
+    plt.close(fig)
+    print(f"Figure saved to: {path}")
+    return path
@@ -0,0 +1,292 @@
+"""Loading of the GIS layers used by the site search and development analysis.
+
+A region of interest (bounding box or polygon in the project CRS) and a column projection
+are pushed down into the read, so for small-area runs only the features intersecting the
+region (grown by a per-layer halo) and the attributes the analysis uses are parsed. Only
+plots intersecting the region itself are sites; the halo is context for their constraints
+and for the development-conditions analysis around them.
+
+ingest_layers converts the source GML/GPKG files once into a GeoParquet store: validated,
+reprojected to the project CRS, pruned to the used columns, stored in Hilbert-curve order
+with a per-row bbox covering column so that region reads skip whole row groups. Loading
+uses the store for every layer whose source file is unchanged since ingest.
+
+Every loaded layer records in attrs['source'] which file (with its size and modification time)
+and which read options produced it, so layer_fingerprint can identify it without rehashing its WKB.
+
+load_bundle also assigns buildings to plots once (BuildingAssignment), so later stages look
+up the buildings of a plot without recomputing centroids.
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pyogrio
+from pyproj import CRS
+import shapely
+from shapely.geometry import box
+
+from .building_assignment import BuildingAssignment
+from .development_conditions import MAX_ANALYSIS_RADIUS
+from .raster import RasterSampler
+
+# CRS of all layers once loaded
+TARGET_CRS = "EPSG:2177"
+
+# Default location of the ingested GeoParquet store
+STORE_DIR = 'data/store'
+
+# Column of the stored layers holding the feature order of the source file
+ORDER_COLUMN = '_source_order'
+
+@dataclass
+class LayerSpec:
+    """Where a GIS layer lives and which part of it is needed"""
+    path: str
+    columns: Optional[List[str]] = None   # Attribute columns to read (None = all, [] = geometry only)
+    source_crs: Optional[str] = None      # CRS to assign when the file lacks one or declares a wrong one
+    halo: float = 0.0                     # Margin around the region of interest in meters
+    where: Optional[str] = None           # Optional SQL attribute filter
+
+# Margin for the neighbors of plots at the edge of an area (and the roads crossing them), in meters
+NEIGHBOR_HALO = 100
+
+# Halo of the layers the development conditions of a site in the region are analyzed on:
+# the largest analysis radius plus the neighbors of the plots at its edge
+ANALYSIS_HALO = MAX_ANALYSIS_RADIUS + NEIGHBOR_HALO
+
+# Layers of the retirement home site search. Churches and green areas only feed
+# nearest-distance metrics, so they get a wide halo to keep the nearest features in range.
+DEFAULT_LAYERS = {
+    'plots': LayerSpec('data/GIS/2261_dzialki_egib_wfs_gml.gml', columns=['gml_id'],
+                       source_crs=TARGET_CRS, halo=ANALYSIS_HALO),
+    'roads': LayerSpec('data/GIS/2261_ulice_egib_wfs_gml.gml', columns=['gml_id'],
+                       source_crs=TARGET_CRS, halo=ANALYSIS_HALO),
+    'buildings': LayerSpec('data/GIS/budynki_2022.gpkg', columns=['GID', 'FUNKCJA', 'LICZBA_KONDYGNACJI', 'WYSOKOSC'],
+                           source_crs=TARGET_CRS, halo=ANALYSIS_HALO),
+    'churches': LayerSpec('data/GIS/churches.gpkg', columns=[], halo=3000),
+    'green_areas': LayerSpec('data/GIS/green_areas.gpkg', columns=[], halo=3000),
+    'noise_map': LayerSpec('data/GIS/noise/noise_map.gpkg', columns=['min_noise'], halo=100)
+}
+
+def region_of_interest(bbox: Optional[Sequence[float]] = None, polygon=None, halo: float = 0.0):
+    """Region of interest in the project CRS from a (minx, miny, maxx, maxy) box and/or a polygon"""
+    if bbox is None and polygon is None:
+        raise ValueError("Region of interest needs a bbox or a polygon")
+    parts = [box(*bbox)] if bbox is not None else []
+    if polygon is not None:
+        parts.append(polygon)
+    region = shapely.union_all(parts)
+    return region.buffer(halo) if halo else region
+
+def _file_crs(spec: LayerSpec):
+    """CRS the coordinates of a layer file are in"""
+    if spec.source_crs is not None:
+        return spec.source_crs
+    return pyogrio.read_info(spec.path).get('crs')
+
+def read_layer(spec: LayerSpec, region=None, target_crs: str = TARGET_CRS) -> gpd.GeoDataFrame:
+    """Read the features of a layer intersecting the region (plus halo) in source order, reprojected to target_crs"""
+    file_crs = _file_crs(spec)
+    filters = {}
+    if region is not None:
+        area = region.buffer(spec.halo) if spec.halo else region
+        if file_crs is not None and CRS.from_user_input(file_crs) != CRS.from_user_input(target_crs):
+            area = gpd.GeoSeries([area], crs=target_crs).to_crs(file_crs).iloc[0]
+        # A plain bbox lets the driver use its spatial index directly
+        if area.equals(area.envelope):
+            filters['bbox'] = area.bounds
+        else:
+            filters['mask'] = area
+
+    layer = gpd.read_file(spec.path, columns=spec.columns, where=spec.where, fid_as_index=True, **filters)
+    # Spatial filters return features in spatial index order (e.g. the R-tree of a GeoPackage);
+    # restore the order of the file like read_stored_layer does
+    layer = layer.sort_index(kind='stable').reset_index(drop=True)
+    if spec.source_crs is not None:
+        layer = layer.set_crs(spec.source_crs, allow_override=True)
+    layer = layer.to_crs(target_crs) if layer.crs is not None else layer.set_crs(target_crs)
+    layer.attrs['source'] = _describe_read(spec.path, region, columns=spec.columns, where=spec.where,
+                                           source_crs=spec.source_crs, target_crs=target_crs, halo=spec.halo)
+    return layer
+
+def load_layers(specs: Dict[str, LayerSpec], region=None, target_crs: str = TARGET_CRS,
+                store_dir: Optional[str] = None, max_workers: Optional[int] = None) -> Dict[str, gpd.GeoDataFrame]:
+    """Read every layer of specs restricted to the region of interest, from the store when it is up to date
+    
+    Layers are read concurrently on a thread pool; the readers release the GIL while parsing.
+    """
+    layers, _ = _run_concurrently(_layer_tasks(specs, region, target_crs, store_dir), max_workers)
+    return layers
+
+def _layer_tasks(specs: Dict[str, LayerSpec], region, target_crs: str, store_dir: Optional[str]) -> Dict[str, Callable]:
+    """One reader per layer: the store when it is up to date, the source file otherwise"""
+    manifest = read_manifest(store_dir) if store_dir is not None else {}
+    tasks = {}
+    for name, spec in specs.items():
+        if target_crs == manifest.get('crs') and _is_fresh(manifest.get('layers', {}).get(name), spec):
+            tasks[name] = partial(read_stored_layer, store_dir, name, spec, region)
+        else:
+            tasks[name] = partial(read_layer, spec, region, target_crs)
+    return tasks
+
+def _run_concurrently(tasks: Dict[str, Callable], max_workers: Optional[int] = None) -> Tuple[Dict, Dict[str, float]]:
+    """Run named loading tasks on a thread pool and report the time each took"""
+    def timed(name):
+        start = time.perf_counter()
+        result = tasks[name]()
+        return result, time.perf_counter() - start
+    
+    start = time.perf_counter()
+    outcomes = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(tasks) or 1) as executor:
+        futures = {executor.submit(timed, name): name for name in tasks}
+        for future in as_completed(futures):
+            name = futures[future]
+            result, seconds = outcomes[name] = future.result()
+            size = f"{len(result)} features" if isinstance(result, gpd.GeoDataFrame) else "raster"
+            print(f"Loaded {name} ({size}) in {seconds:.2f}s")
+    print(f"Loaded {len(tasks)} inputs in {time.perf_counter() - start:.2f}s")
+    return ({name: outcomes[name][0] for name in tasks},
+            {name: outcomes[name][1] for name in tasks})
+
+@dataclass
+class LayerBundle:
+    """Input layers of a search, ready for SiteSearch and DevelopmentConditions"""
+    plots: gpd.GeoDataFrame
+    roads: gpd.GeoDataFrame
+    buildings: gpd.GeoDataFrame
+    churches: gpd.GeoDataFrame
+    green_areas: gpd.GeoDataFrame
+    noise_map: gpd.GeoDataFrame
+    senior_density_path: str
+    region: Optional[object] = None                         # Region of interest the sites lie in (None = everywhere)
+    senior_density: Optional[RasterSampler] = None          # Sampler over the opened raster
+    building_assignment: Optional[BuildingAssignment] = None  # Buildings per plot by centroid
+    timings: Dict[str, float] = field(default_factory=dict)  # Seconds spent loading each input
+
+def load_bundle(senior_density_path: str, specs: Dict[str, LayerSpec] = DEFAULT_LAYERS, region=None,
+                store_dir: Optional[str] = None, max_workers: Optional[int] = None) -> LayerBundle:
+    """Load all vector layers and open the senior density raster concurrently, then assign buildings to plots"""
+    tasks = _layer_tasks(specs, region, TARGET_CRS, store_dir)
+    tasks['senior_density'] = partial(RasterSampler, senior_density_path)
+    results, timings = _run_concurrently(tasks, max_workers)
+    
+    start = time.perf_counter()
+    building_assignment = BuildingAssignment(results['plots'], results['buildings'])
+    timings['building_assignment'] = time.perf_counter() - start
+    print(f"Assigned {int((building_assignment.plot_of_building >= 0).sum())} buildings to plots "
+          f"in {timings['building_assignment']:.2f}s")
+    return LayerBundle(
+        plots=results['plots'],
+        roads=results['roads'],
+        buildings=results['buildings'],
+        churches=results['churches'],
+        green_areas=results['green_areas'],
+        noise_map=results['noise_map'],
+        senior_density_path=senior_density_path,
+        region=region,
+        senior_density=results['senior_density'],
+        building_assignment=building_assignment,
+        timings=timings
+    )
+
+def _source_stamp(path: str) -> Dict:
+    """Size and modification time identifying a version of a source file"""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+def _describe_read(path: str, region=None, **options) -> str:
+    """Description of a read of a file, identifying the result while the file is unchanged (see layer_fingerprint)"""
+    description = {'path': os.path.abspath(path), **_source_stamp(path), **options,
+                   'region': hashlib.sha256(region.wkb).hexdigest() if region is not None else None}
+    return json.dumps(description, sort_keys=True)
+
+def _is_fresh(entry: Optional[Dict], spec: LayerSpec) -> bool:
+    """Whether a stored layer was ingested from the current source with all needed columns"""
+    if entry is None or entry['source'] != spec.path or spec.where is not None:
+        return False
+    if not os.path.exists(spec.path) or entry['source_stamp'] != _source_stamp(spec.path):
+        return False
+    if spec.columns is None:
+        return entry['columns'] is None
+    return entry['columns'] is not None and set(spec.columns) <= set(entry['columns'])
+
+def read_manifest(store_dir: str) -> Dict:
+    """Manifest of an ingested store (empty when there is none)"""
+    path = os.path.join(store_dir, 'manifest.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def validate_layer(layer: gpd.GeoDataFrame, name: str) -> gpd.GeoDataFrame:
+    """Drop features without geometry and repair invalid geometries"""
+    missing = layer.geometry.isna() | layer.geometry.is_empty
+    if missing.any():
+        print(f"Dropping {int(missing.sum())} {name} features without geometry")
+        layer = layer[~missing]
+    invalid = ~layer.geometry.is_valid
+    if invalid.any():
+        print(f"Repairing {int(invalid.sum())} invalid {name} geometries")
+        layer = layer.copy()
+        layer.loc[invalid, layer.geometry.name] = shapely.make_valid(layer.geometry[invalid].values)
+    return layer
+
+def ingest_layers(specs: Dict[str, LayerSpec] = DEFAULT_LAYERS, store_dir: str = STORE_DIR,
+                  target_crs: str = TARGET_CRS, row_group_size: int = 10000) -> Dict:
+    """Convert source layers into the GeoParquet store and write its manifest"""
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = read_manifest(store_dir)
+    if manifest.get('crs') != target_crs:
+        manifest = {'crs': target_crs, 'layers': {}}
+
+    for name, spec in specs.items():
+        start = time.perf_counter()
+        layer = validate_layer(read_layer(spec, target_crs=target_crs), name)
+        # Spatially clustered rows give every row group a tight bbox; the source order is kept in a column
+        layer = layer.assign(**{ORDER_COLUMN: range(len(layer))}).reset_index(drop=True)
+        if len(layer):
+            layer = layer.iloc[np.argsort(layer.geometry.hilbert_distance(), kind='stable')]
+        filename = f"{name}.parquet"
+        layer.to_parquet(os.path.join(store_dir, filename), index=False, write_covering_bbox=True,
+                         row_group_size=row_group_size)
+        manifest['layers'][name] = {
+            'file': filename,
+            'source': spec.path,
+            'source_stamp': _source_stamp(spec.path),
+            'columns': spec.columns,
+            'features': len(layer),
+            'bounds': [float(v) for v in layer.total_bounds] if len(layer) else None
+        }
+        print(f"Ingested {len(layer)} {name} features in {time.perf_counter() - start:.1f}s")
+
+    with open(os.path.join(store_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def read_stored_layer(store_dir: str, name: str, spec: LayerSpec, region=None) -> gpd.GeoDataFrame:
+    """Read an ingested layer, restricted to the region of interest (plus halo), in source order"""
+    entry = read_manifest(store_dir)['layers'][name]
+    columns = (spec.columns if spec.columns is not None else
+               [c for c in entry['columns'] or [] if c != 'geometry'] or None)
+    read_columns = None if columns is None else [*columns, 'geometry', ORDER_COLUMN]
+    path = os.path.join(store_dir, entry['file'])
+
+    if region is None:
+        layer = gpd.read_parquet(path, columns=read_columns)
+    else:
+        area = region.buffer(spec.halo) if spec.halo else region
+        layer = gpd.read_parquet(path, columns=read_columns, bbox=area.bounds)
+        layer = layer[layer.intersects(area)]
+
+    layer = layer.sort_values(ORDER_COLUMN, kind='stable').drop(columns=ORDER_COLUMN).reset_index(drop=True)
+    layer.attrs['source'] = _describe_read(path, region, columns=columns, halo=spec.halo)
+    return layer
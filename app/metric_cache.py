@@ -0,0 +1,110 @@
+import hashlib
+import os
+from typing import Callable, Dict, Sequence
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+def layer_fingerprint(gdf: gpd.GeoDataFrame) -> str:
+    """Hash identifying a layer's geometries, attributes and CRS
+    
+    Layers read by app.layers carry a description of their source file (path, size, modification
+    time and read options) in attrs['source']. pandas keeps attrs on derived frames, so their
+    fingerprint combines it with a cheap hash of the content (coordinates and attribute values)
+    instead of rehashing the WKB; edits made after loading still change it. Other layers are
+    hashed in full.
+    """
+    source = gdf.attrs.get('source')
+    if source is not None:
+        digest = hashlib.sha256(source.encode())
+        digest.update(str(gdf.crs).encode())
+        digest.update(','.join(map(str, gdf.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(gdf.index, index=False).to_numpy().tobytes())
+        geometries = np.asarray(gdf.geometry.values)
+        digest.update(shapely.get_num_coordinates(geometries).astype(np.int64).tobytes())
+        digest.update(shapely.get_coordinates(geometries).tobytes())
+        attributes = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+        if len(attributes.columns):
+            digest.update(pd.util.hash_pandas_object(attributes, index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+    
+    digest = hashlib.sha256()
+    digest.update(str(gdf.crs).encode())
+    wkb = shapely.to_wkb(np.asarray(gdf.geometry.values))
+    digest.update(np.array([len(w) if w is not None else -1 for w in wkb], dtype=np.int64).tobytes())
+    digest.update(b''.join(w for w in wkb if w is not None))
+    attributes = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+    digest.update(','.join(map(str, attributes.columns)).encode())
+    if len(attributes.columns):
+        digest.update(pd.util.hash_pandas_object(attributes, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def file_fingerprint(path: str, chunk_size: int = 2**20) -> str:
+    """Content hash of a file such as a raster"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def plot_keys(plots: gpd.GeoDataFrame) -> np.ndarray:
+    """Cache key of each plot: a hash of its gml_id and geometry, so plots sharing a gml_id are kept apart"""
+    return pd.util.hash_pandas_object(pd.DataFrame({
+        'gml_id': plots['gml_id'].to_numpy(),
+        'geometry': shapely.to_wkb(np.asarray(plots.geometry.values), hex=True)
+    }), index=False).to_numpy()
+
+class MetricCache:
+    """On-disk cache of per-plot metrics, one Parquet file per metric and input fingerprints
+
+    Each metric is keyed by the fingerprints of the layers it is computed from, so changing
+    one layer only invalidates the metrics that depend on it. Within an entry plots are keyed
+    by gml_id and geometry (see plot_keys). Entries grow incrementally: plots missing from an
+    entry are computed and appended on the next fetch.
+    """
+
+    def __init__(self, cache_dir: str = 'output/cache'):
+        self.cache_dir = cache_dir
+        self._entries: Dict[str, pd.DataFrame] = {}
+
+    def _entry_path(self, name: str, fingerprints: Sequence[str]) -> str:
+        key = hashlib.sha256('|'.join(fingerprints).encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{name}-{key}.parquet")
+
+    def _load(self, path: str) -> pd.DataFrame:
+        if path not in self._entries:
+            cached = pd.read_parquet(path) if os.path.exists(path) else None
+            # Entries written before plots were keyed by geometry are recomputed
+            self._entries[path] = cached if cached is not None and cached.index.name == 'plot_key' else None
+        return self._entries[path]
+
+    def fetch(self,
+              name: str,
+              fingerprints: Sequence[str],
+              plots: gpd.GeoDataFrame,
+              compute: Callable[[gpd.GeoDataFrame], pd.DataFrame]) -> pd.DataFrame:
+        """Return metrics for plots (indexed like plots), computing only plots not yet cached
+
+        `compute` receives a subset of plots and returns a DataFrame indexed like it.
+        """
+        if plots.empty:
+            return compute(plots)
+        path = self._entry_path(name, fingerprints)
+        cached = self._load(path)
+        keys = pd.Index(plot_keys(plots), name='plot_key')
+
+        missing = ~keys.isin(cached.index) if cached is not None else np.ones(len(plots), dtype=bool)
+        if missing.any():
+            computed = compute(plots[missing])
+            computed.index = keys[missing]
+            computed = computed[~computed.index.duplicated()]
+            cached = computed if cached is None else pd.concat([cached, computed])
+            os.makedirs(self.cache_dir, exist_ok=True)
+            cached.to_parquet(path)
+            self._entries[path] = cached
+
+        result = cached.reindex(keys)
+        result.index = plots.index
+        return result
@@ -1,7 +1,9 @@
 from dataclasses import dataclass
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Iterator, Union
 from shapely.geometry import Polygon
 import numpy as np
+import pandas as pd
+import geopandas as gpd
 
 @dataclass
 class RetirementHome:
@@ -20,12 +22,15 @@ class RetirementHome:
         max_residents, 
         stories,
         quality_level=None,
-        staffing_benchmarks=None
+        staffing_benchmarks=None,
+        sqm_per_resident=None
     ):
         self.version = version
         self.min_residents = min_residents
         self.max_residents = max_residents
         self.stories = stories
+        if sqm_per_resident is not None:
+            self.sqm_per_resident = sqm_per_resident
         self.quality_level = quality_level
         self.staffing_benchmarks = staffing_benchmarks
         
@@ -72,6 +77,7 @@ class SiteConstraints:
     min_plot_area: float = 3500    # Minimum plot area in sqm
     max_plot_area: float = 7500    # Maximum plot area in sqm
     min_shape_index: float = 0.6   # Minimum shape regularity index
+    max_distance_to_road: Optional[float] = None  # Maximum distance from plot to nearest road in m (None = no limit)
 
 @dataclass
 class SitePenaltyWeights:
@@ -80,6 +86,16 @@ class SitePenaltyWeights:
     church_penalty: float = 0.2    # Weight for distance to churches
     noise_penalty: float = 0.3     # Weight for noise level
     senior_penalty: float = 0.1    # Weight for senior population density
+    
+    def to_array(self) -> np.ndarray:
+        """Return the weights as a vector ordered like the penalty columns"""
+        return np.array([self.green_penalty, self.church_penalty, self.noise_penalty, self.senior_penalty], dtype=float)
+    
+    @classmethod
+    def from_array(cls, values) -> 'SitePenaltyWeights':
+        """Create weights from a vector ordered like the penalty columns"""
+        green, church, noise, senior = (float(v) for v in values)
+        return cls(green_penalty=green, church_penalty=church, noise_penalty=noise, senior_penalty=senior)
 
 @dataclass
 class NormalizationRanges:
@@ -92,6 +108,27 @@ class NormalizationRanges:
     max_noise: float
     min_senior: float
     max_senior: float
+    
+    @classmethod
+    def from_metrics(cls, metrics: pd.DataFrame) -> 'NormalizationRanges':
+        """Calculate ranges from raw site metrics"""
+        values = metrics[METRIC_COLUMNS].astype(float)
+        return cls.from_arrays(values.min().to_numpy(), values.max().to_numpy())
+    
+    @classmethod
+    def from_arrays(cls, minima, maxima) -> 'NormalizationRanges':
+        """Create ranges from per-metric minima and maxima ordered like the metric columns"""
+        return cls(
+            min_green_distance=float(minima[0]),
+            max_green_distance=float(maxima[0]),
+            min_church_distance=float(minima[1]),
+            max_church_distance=float(maxima[1]),
+            min_noise=float(50),
+            max_noise=float(maxima[2]),
+            min_senior=float(minima[3]),
+            max_senior=float(maxima[3])
+        )
+
 
 @dataclass
 class SiteCandidate:
@@ -106,6 +143,7 @@ class SiteCandidate:
     distance_to_nearest_church: Optional[float] = None  # Distance to nearest church
     noise_level: Optional[float] = None  # Noise level in dB
     senior_density: Optional[float] = None  # Senior population density
+    distance_to_road: Optional[float] = None  # Distance from plot to nearest road
     
     score: float = 0.0            # Final site suitability score
     
@@ -114,7 +152,8 @@ class SiteCandidate:
         return (
             constraints.min_plot_area <= self.area <= constraints.max_plot_area and
             self.shape_index >= constraints.min_shape_index and
-            self.distance_to_road <= constraints.max_distance_to_road
+            (constraints.max_distance_to_road is None or self.distance_to_road is None or
+             self.distance_to_road <= constraints.max_distance_to_road)
         )
     
     def calculate_score(self, weights: SitePenaltyWeights, ranges: NormalizationRanges) -> float:
@@ -127,43 +166,182 @@ class SiteCandidate:
         ]):
             raise ValueError("All metrics must be set before calculating score")
         
-        def normalize(value: float, min_val: float, max_val: float) -> float:
-            """Normalize value to 0-1 range where 0 is best"""
-            if max_val == min_val:
-                return 0
-            return (value - min_val) / (max_val - min_val)
-        
-        # Calculate penalties using pre-calculated ranges
-        green_penalty = normalize(
-            self.distance_to_nearest_green,
-            ranges.min_green_distance,
-            ranges.max_green_distance
+        penalties = calculate_penalties(
+            np.array([self.distance_to_nearest_green], dtype=float),
+            np.array([self.distance_to_nearest_church], dtype=float),
+            np.array([self.noise_level], dtype=float),
+            np.array([self.senior_density], dtype=float),
+            ranges
         )
+        self.score = float(weighted_score(penalties, weights)[0])
         
-        church_penalty = normalize(
-            self.distance_to_nearest_church,
-            ranges.min_church_distance,
-            ranges.max_church_distance
-        )
-        
-        noise_penalty = normalize(
-            np.log(self.noise_level),
-            np.log(ranges.min_noise),
-            np.log(ranges.max_noise)
+        return self.score
+
+PENALTY_COLUMNS = ['green_penalty', 'church_penalty', 'noise_penalty', 'senior_penalty']
+
+METRIC_COLUMNS = [
+    'distance_to_nearest_green',
+    'distance_to_nearest_church',
+    'noise_level',
+    'senior_density'
+]
+
+def normalize(values: np.ndarray, min_val: float, max_val: float) -> np.ndarray:
+    """Normalize values to 0-1 range where 0 is best"""
+    if max_val == min_val:
+        return np.zeros(len(values))
+    return (values - min_val) / (max_val - min_val)
+
+def calculate_penalties(green_distances: np.ndarray,
+                        church_distances: np.ndarray,
+                        noise_levels: np.ndarray,
+                        senior_densities: np.ndarray,
+                        ranges: NormalizationRanges) -> np.ndarray:
+    """Calculate normalized penalties for all sites at once, one column per penalty factor"""
+    green_penalty = normalize(green_distances, ranges.min_green_distance, ranges.max_green_distance)
+    church_penalty = normalize(church_distances, ranges.min_church_distance, ranges.max_church_distance)
+    noise_penalty = normalize(np.log(noise_levels), np.log(ranges.min_noise), np.log(ranges.max_noise))
+    senior_penalty = 1 - normalize(senior_densities, ranges.min_senior, ranges.max_senior)  # Invert so higher density = lower penalty
+    return np.column_stack([green_penalty, church_penalty, noise_penalty, senior_penalty])
+
+def weighted_score(penalties: np.ndarray, weights: SitePenaltyWeights) -> np.ndarray:
+    """Combine a penalty matrix into site scores using penalty weights"""
+    return (
+        penalties[:, 0] * weights.green_penalty +
+        penalties[:, 1] * weights.church_penalty +
+        penalties[:, 2] * weights.noise_penalty +
+        penalties[:, 3] * weights.senior_penalty
+    )
+
+def weight_matrix(weights_batch) -> np.ndarray:
+    """Stack SitePenaltyWeights objects (or an array of weight vectors) into a (n_weights, 4) matrix"""
+    if isinstance(weights_batch, SitePenaltyWeights):
+        weights_batch = [weights_batch]
+    if isinstance(weights_batch, np.ndarray):
+        matrix = weights_batch.astype(float)
+    else:
+        matrix = np.array([
+            w.to_array() if isinstance(w, SitePenaltyWeights) else np.asarray(w, dtype=float)
+            for w in weights_batch
+        ], dtype=float)
+    matrix = np.atleast_2d(matrix)
+    if matrix.shape[1] != len(PENALTY_COLUMNS):
+        raise ValueError(f"Weight vectors must have {len(PENALTY_COLUMNS)} components")
+    return matrix
+
+def top_k_positions(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the positions of the k lowest scores in each row, best first"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.intp)
+    if k < scores.shape[1]:
+        top = np.argpartition(scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(k), scores.shape).copy()
+    order = np.argsort(np.take_along_axis(scores, top, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1)
+
+class SiteCandidateSet:
+    """Columnar set of site candidates with vectorized scoring
+    
+    Metrics live in a DataFrame and geometries in a shapely array; SiteCandidate
+    objects are only created when individual candidates are accessed.
+    """
+    
+    def __init__(self, data: pd.DataFrame, geometry: np.ndarray):
+        self.data = data.reset_index(drop=True)
+        self.geometry = np.asarray(geometry, dtype=object)
+        self.penalties = None
+        if 'score' not in self.data:
+            self.data['score'] = 0.0
+    
+    @classmethod
+    def from_candidates(cls, candidates: List[SiteCandidate]) -> 'SiteCandidateSet':
+        """Build a candidate set from SiteCandidate objects"""
+        data = pd.DataFrame({
+            'plot_id': [c.plot_id for c in candidates],
+            'area': [c.area for c in candidates],
+            'shape_index': [c.shape_index for c in candidates],
+            **{column: [getattr(c, column) for c in candidates] for column in METRIC_COLUMNS},
+            'score': [c.score for c in candidates]
+        })
+        return cls(data, [c.geometry for c in candidates])
+    
+    def __len__(self) -> int:
+        return len(self.data)
+    
+    def __iter__(self) -> Iterator[SiteCandidate]:
+        for position in range(len(self)):
+            yield self._candidate_at(position)
+    
+    def __getitem__(self, key: Union[int, slice, np.ndarray]) -> Union[SiteCandidate, 'SiteCandidateSet']:
+        """Return a SiteCandidate for an integer position, or a subset for a slice or index array"""
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError("candidate index out of range")
+            return self._candidate_at(int(key))
+        positions = np.arange(len(self))[key]
+        return self.take(positions)
+    
+    def _candidate_at(self, position: int) -> SiteCandidate:
+        """Materialize the candidate at a position"""
+        row = self.data.iloc[position]
+        return SiteCandidate(
+            plot_id=row['plot_id'],
+            geometry=self.geometry[position],
+            area=row['area'],
+            shape_index=row['shape_index'],
+            distance_to_nearest_green=row['distance_to_nearest_green'],
+            distance_to_nearest_church=row['distance_to_nearest_church'],
+            noise_level=row['noise_level'],
+            senior_density=row['senior_density'],
+            distance_to_road=row.get('distance_to_road'),
+            score=row['score']
         )
-        
-        senior_penalty = 1 - normalize(
-            self.senior_density,
-            ranges.min_senior,
-            ranges.max_senior
-        )  # Invert so higher density = lower penalty
-        
-        # Calculate weighted score
-        self.score = (
-            green_penalty * weights.green_penalty +
-            church_penalty * weights.church_penalty +
-            noise_penalty * weights.noise_penalty +
-            senior_penalty * weights.senior_penalty
+    
+    def take(self, positions: np.ndarray) -> 'SiteCandidateSet':
+        """Return a new set with the candidates at the given positions"""
+        subset = SiteCandidateSet(self.data.iloc[positions], self.geometry[positions])
+        if self.penalties is not None:
+            subset.penalties = self.penalties[positions]
+        return subset
+    
+    def calculate_penalties(self, ranges: NormalizationRanges) -> np.ndarray:
+        """Calculate and keep the normalized penalty matrix for all candidates"""
+        if self.data[METRIC_COLUMNS].isna().any().any():
+            raise ValueError("All metrics must be set before calculating score")
+        self.penalties = calculate_penalties(
+            *(self.data[column].to_numpy(dtype=float) for column in METRIC_COLUMNS),
+            ranges
         )
-        
-        return self.score 
\ No newline at end of file
+        return self.penalties
+    
+    def calculate_scores(self, weights: SitePenaltyWeights, ranges: NormalizationRanges) -> np.ndarray:
+        """Calculate site suitability scores for all candidates in one pass"""
+        scores = weighted_score(self.calculate_penalties(ranges), weights)
+        self.data['score'] = scores
+        return scores
+    
+    def rescore(self, weights: SitePenaltyWeights) -> 'SiteCandidateSet':
+        """Return the candidates re-scored for new weights from the stored penalties, best first"""
+        if self.penalties is None:
+            raise ValueError("Penalties must be calculated before re-scoring")
+        rescored = self.take(np.arange(len(self)))
+        rescored.data['score'] = weighted_score(self.penalties, weights)
+        return rescored.sort_by_score()
+    
+    def score_matrix(self, weights_batch) -> np.ndarray:
+        """Score all candidates for a batch of weight vectors, one row per weight vector"""
+        if self.penalties is None:
+            raise ValueError("Penalties must be calculated before re-scoring")
+        return weight_matrix(weights_batch) @ self.penalties.T
+    
+    def sort_by_score(self) -> 'SiteCandidateSet':
+        """Return the candidates ordered by score, best (lowest penalty) first"""
+        return self.take(np.argsort(self.data['score'].to_numpy(), kind='stable'))
+    
+    def to_geodataframe(self, crs=None) -> gpd.GeoDataFrame:
+        """Return the candidate set as a GeoDataFrame"""
+        return gpd.GeoDataFrame(self.data.copy(), geometry=list(self.geometry), crs=crs)
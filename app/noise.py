@@ -0,0 +1,95 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from typing import Sequence
+
+class NoiseExposure:
+    """Batched overlay of plots against a prebuilt spatial index of the noise map
+
+    Supported statistics per plot:
+    - 'mean': plain mean level of the noise polygons intersecting the plot
+    - 'area_mean': mean level weighted by the area of each polygon inside the plot
+    - 'max': highest level covering part of the plot
+    - 'p<q>' (e.g. 'p90'): area-weighted q-th percentile of the level over the plot
+    For the area-based statistics, parts of a plot outside every noise polygon count at the
+    default level. Plots without any noise polygon get the default level.
+    """
+
+    def __init__(self, noise_map_gdf: gpd.GeoDataFrame, column: str = 'min_noise', default: float = 50.0):
+        noise = noise_map_gdf[noise_map_gdf[column].notna() & ~noise_map_gdf.geometry.is_empty]
+        self.geometries = np.asarray(noise.geometry.values)
+        self.levels = noise[column].to_numpy(dtype=float)
+        self.default = float(default)
+        self.tree = shapely.STRtree(self.geometries)
+
+    def exposure(self, geometries: Sequence, stats: Sequence[str] = ('area_mean',), chunk_size: int = 50000) -> pd.DataFrame:
+        """Return one column per statistic for every plot geometry, processing plots in chunks"""
+        geometries = np.asarray(geometries)
+        chunks = [
+            self._exposure_chunk(geometries[start:start + chunk_size], stats)
+            for start in range(0, len(geometries), chunk_size)
+        ]
+        if not chunks:
+            return pd.DataFrame({stat: np.empty(0) for stat in stats})
+        return pd.concat(chunks, ignore_index=True)
+
+    def _exposure_chunk(self, geometries: np.ndarray, stats: Sequence[str]) -> pd.DataFrame:
+        n = len(geometries)
+        plot_idx, noise_idx = self.tree.query(geometries, predicate='intersects')
+        levels = self.levels[noise_idx]
+        result = {}
+
+        counts = np.bincount(plot_idx, minlength=n)
+        if 'mean' in stats:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = np.bincount(plot_idx, weights=levels, minlength=n) / counts
+            result['mean'] = np.where(counts > 0, means, self.default)
+
+        if any(stat != 'mean' for stat in stats):
+            # Overlay areas of all intersecting pairs in one vectorized call
+            areas = shapely.area(shapely.intersection(geometries[plot_idx], self.geometries[noise_idx]))
+            covered = areas > 0
+            plot_idx, levels, areas = plot_idx[covered], levels[covered], areas[covered]
+            uncovered = np.clip(shapely.area(geometries) - np.bincount(plot_idx, weights=areas, minlength=n), 0, None)
+            has_noise = np.bincount(plot_idx, minlength=n) > 0
+
+            # Treat the uncovered part of each plot as one more area at the default level
+            all_plots = np.concatenate([plot_idx, np.arange(n)])
+            all_levels = np.concatenate([levels, np.full(n, self.default)])
+            all_areas = np.concatenate([areas, uncovered])
+
+            for stat in stats:
+                if stat == 'area_mean':
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        weighted = (np.bincount(all_plots, weights=all_levels * all_areas, minlength=n) /
+                                    np.bincount(all_plots, weights=all_areas, minlength=n))
+                    result[stat] = np.where(has_noise & np.isfinite(weighted), weighted, self.default)
+                elif stat == 'max':
+                    maxima = np.full(n, -np.inf)
+                    np.maximum.at(maxima, plot_idx, levels)
+                    result[stat] = np.where(has_noise, maxima, self.default)
+                elif stat.startswith('p'):
+                    percentiles = _weighted_percentile(all_plots, all_levels, all_areas, float(stat[1:]), n)
+                    result[stat] = np.where(has_noise, percentiles, self.default)
+                elif stat != 'mean':
+                    raise ValueError(f"Unknown noise statistic: {stat}")
+
+        return pd.DataFrame({stat: result[stat] for stat in stats})
+
+def _weighted_percentile(groups: np.ndarray, values: np.ndarray, weights: np.ndarray, q: float, n: int) -> np.ndarray:
+    """Weighted q-th percentile of values within each group, for groups 0..n-1"""
+    order = np.lexsort((values, groups))
+    groups, values, weights = groups[order], values[order], weights[order]
+    cumulative = np.cumsum(weights)
+    # Group sums taken from the same running sum, so each group's last element reaches its total exactly
+    starts = np.searchsorted(groups, np.arange(n), side='left')
+    ends = np.searchsorted(groups, np.arange(n), side='right')
+    before = np.where(starts > 0, cumulative[np.maximum(starts - 1, 0)], 0.0)
+    totals = np.where(ends > starts, cumulative[np.maximum(ends - 1, 0)] - before, 0.0)
+    within = cumulative - before[groups]
+    reached = np.flatnonzero(within >= q / 100 * totals[groups])
+    first_groups, first = np.unique(groups[reached], return_index=True)
+    result = np.full(n, np.nan)
+    result[first_groups] = values[reached[first]]
+    return result
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+from typing import Optional
+from .models import SiteCandidateSet, SitePenaltyWeights, top_k_positions
+
+def sample_weights(weights: SitePenaltyWeights,
+                   n_samples: int,
+                   concentration: float = 50.0,
+                   rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """Sample weight vectors from a Dirichlet distribution centred on the given weights
+
+    Higher concentration keeps samples closer to the given weights. Samples are scaled
+    to the same total as the given weights.
+    """
+    rng = np.random.default_rng(rng)
+    base = weights.to_array()
+    total = base.sum()
+    if total <= 0:
+        raise ValueError("Penalty weights must have a positive sum")
+    # Dirichlet parameters must be strictly positive
+    alpha = np.maximum(concentration * base / total, 1e-3)
+    return rng.dirichlet(alpha, size=n_samples) * total
+
+def ranking_stability(candidates: SiteCandidateSet,
+                      weights: SitePenaltyWeights,
+                      n_samples: int = 10000,
+                      top_k: int = 6,
+                      concentration: float = 50.0,
+                      max_chunk_bytes: int = 64 * 2**20,
+                      seed: Optional[int] = None) -> pd.DataFrame:
+    """Estimate each candidate's probability of ranking in the top k under uncertain weights
+
+    Weight samples are scored against the candidates' normalized penalty matrix in chunks
+    of whole score matrices, so memory stays bounded by max_chunk_bytes.
+    """
+    if candidates.penalties is None:
+        raise ValueError("Penalties must be calculated before analyzing ranking stability")
+    n_candidates = len(candidates)
+    samples = sample_weights(weights, n_samples, concentration, np.random.default_rng(seed))
+
+    # Count how often each candidate lands in the top k
+    top_counts = np.zeros(n_candidates, dtype=np.int64)
+    chunk_size = max(1, max_chunk_bytes // (8 * max(n_candidates, 1)))
+    for start in range(0, n_samples, chunk_size):
+        scores = candidates.score_matrix(samples[start:start + chunk_size])
+        top = top_k_positions(scores, top_k)
+        top_counts += np.bincount(top.ravel(), minlength=n_candidates)
+
+    return pd.DataFrame({
+        'plot_id': candidates.data['plot_id'].to_numpy(),
+        'score': candidates.data['score'].to_numpy(),
+        f'p_top_{top_k}': top_counts / max(n_samples, 1)
+    })
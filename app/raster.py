@@ -0,0 +1,153 @@
+from contextlib import nullcontext
+import numpy as np
+import pandas as pd
+import shapely
+from typing import Iterator, Sequence, Tuple
+
+class RasterSampler:
+    """Bulk point sampling and zonal statistics over one raster band
+
+    The band is read into memory once when it fits within max_memory_bytes; larger
+    rasters are processed through windowed reads of window_size x window_size pixels.
+    """
+
+    def __init__(self, path: str, band: int = 1, max_memory_bytes: int = 512 * 2**20, window_size: int = 2048):
+        self.path = path
+        self.band = band
+        self.window_size = window_size
+        import rasterio
+        with rasterio.open(path) as src:
+            self.transform = src.transform
+            self.width = src.width
+            self.height = src.height
+            self.nodata = src.nodata
+            self.dtype = np.dtype(src.dtypes[band - 1])
+            in_memory = self.width * self.height * self.dtype.itemsize <= max_memory_bytes
+            self.data = src.read(band) if in_memory else None
+
+    def _read(self, src, row_off: int, col_off: int, height: int, width: int) -> np.ndarray:
+        """Read a block of the band, from memory when available"""
+        if self.data is not None:
+            return self.data[row_off:row_off + height, col_off:col_off + width]
+        from rasterio.windows import Window
+        return src.read(self.band, window=Window(col_off, row_off, width, height))
+
+    def _open(self):
+        """Open the raster only when the band is not in memory"""
+        if self.data is not None:
+            return nullcontext()
+        import rasterio
+        return rasterio.open(self.path)
+
+    def pixel_indices(self, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Map coordinates to (row, col) pixel indices with the inverse affine transform"""
+        inverse = ~self.transform
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        cols = np.floor(inverse.a * xs + inverse.b * ys + inverse.c).astype(np.int64)
+        rows = np.floor(inverse.d * xs + inverse.e * ys + inverse.f).astype(np.int64)
+        return rows, cols
+
+    def sample(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """Return the pixel value under every point; points off the raster get the nodata value (or 0)"""
+        rows, cols = self.pixel_indices(xs, ys)
+        fill = self.nodata if self.nodata is not None else 0
+        values = np.full(len(rows), fill, dtype=self.dtype)
+        inside = (rows >= 0) & (rows < self.height) & (cols >= 0) & (cols < self.width)
+        if self.data is not None:
+            values[inside] = self.data[rows[inside], cols[inside]]
+            return values
+
+        # Group points by window so every block is read once
+        positions = np.flatnonzero(inside)
+        block_rows = rows[positions] // self.window_size
+        block_cols = cols[positions] // self.window_size
+        block_keys = block_rows * ((self.width - 1) // self.window_size + 1) + block_cols
+        order = np.argsort(block_keys, kind='stable')
+        with self._open() as src:
+            for group in np.split(order, np.flatnonzero(np.diff(block_keys[order])) + 1):
+                if len(group) == 0:
+                    continue
+                row_off = int(block_rows[group[0]]) * self.window_size
+                col_off = int(block_cols[group[0]]) * self.window_size
+                block = self._read(src, row_off, col_off,
+                                   min(self.window_size, self.height - row_off),
+                                   min(self.window_size, self.width - col_off))
+                points = positions[group]
+                values[points] = block[rows[points] - row_off, cols[points] - col_off]
+        return values
+
+    def sample_points(self, points) -> np.ndarray:
+        """Return the pixel value under every point geometry"""
+        coords = shapely.get_coordinates(np.asarray(points))
+        return self.sample(coords[:, 0], coords[:, 1])
+
+    def _windows(self, bounds) -> Iterator[Tuple[int, int, int, int]]:
+        """Yield (row_off, col_off, height, width) windows covering the given bounds"""
+        minx, miny, maxx, maxy = bounds
+        rows, cols = self.pixel_indices([minx, maxx, minx, maxx], [miny, miny, maxy, maxy])
+        row_start = max(int(rows.min()), 0) // self.window_size * self.window_size
+        col_start = max(int(cols.min()), 0) // self.window_size * self.window_size
+        row_stop = min(int(rows.max()) + 1, self.height)
+        col_stop = min(int(cols.max()) + 1, self.width)
+        for row_off in range(row_start, row_stop, self.window_size):
+            for col_off in range(col_start, col_stop, self.window_size):
+                yield (row_off, col_off,
+                       min(self.window_size, self.height - row_off),
+                       min(self.window_size, self.width - col_off))
+
+    def zonal_stats(self, geometries: Sequence, stats: Sequence[str] = ('mean', 'max')) -> pd.DataFrame:
+        """Mean / max / count of the pixels whose centres fall within each polygon
+
+        Polygons are burned into a label raster per window, so overlapping polygons share
+        pixels with the polygon drawn last. Polygons that cover no pixel centre fall back
+        to the pixel under their centroid.
+        """
+        from rasterio.features import rasterize
+        from rasterio.windows import Window, bounds as window_bounds, transform as window_transform
+        geometries = np.asarray(geometries)
+        n = len(geometries)
+        sums = np.zeros(n + 1)
+        counts = np.zeros(n + 1, dtype=np.int64)
+        maxima = np.full(n + 1, -np.inf)
+        tree = shapely.STRtree(geometries)
+
+        if n:
+            with self._open() as src:
+                for row_off, col_off, height, width in self._windows(shapely.total_bounds(geometries)):
+                    window = Window(col_off, row_off, width, height)
+                    hits = tree.query(shapely.box(*window_bounds(window, self.transform)))
+                    if len(hits) == 0:
+                        continue
+                    labels = rasterize(
+                        zip(geometries[hits], hits + 1),
+                        out_shape=(height, width),
+                        transform=window_transform(window, self.transform),
+                        fill=0,
+                        dtype='int32'
+                    )
+                    values = self._read(src, row_off, col_off, height, width).astype(float)
+                    valid = (labels > 0) & ~np.isnan(values)
+                    if self.nodata is not None:
+                        valid &= values != self.nodata
+                    window_labels = labels[valid]
+                    window_values = values[valid]
+                    sums += np.bincount(window_labels, weights=window_values, minlength=n + 1)
+                    counts += np.bincount(window_labels, minlength=n + 1)
+                    np.maximum.at(maxima, window_labels, window_values)
+
+        counts, sums, maxima = counts[1:], sums[1:], maxima[1:]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+
+        # Polygons smaller than a pixel are represented by the pixel under their centroid
+        empty = counts == 0
+        if empty.any():
+            centroid_values = self.sample_points(shapely.centroid(geometries[empty])).astype(float)
+            if self.nodata is not None:
+                centroid_values[centroid_values == self.nodata] = np.nan
+            means[empty] = centroid_values
+            maxima[empty] = centroid_values
+
+        available = {'mean': means, 'max': maxima, 'count': counts}
+        return pd.DataFrame({stat: available[stat] for stat in stats})
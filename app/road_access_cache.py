@@ -0,0 +1,128 @@
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Hashable, List, Optional
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import LineString
+
+@dataclass
+class RoadAccess:
+    """Resolved road access of a plot
+
+    Road neighbors are kept as positions in the plot and road layers (the rows get_road_neighbors
+    returns), the access road as an index into them (-1 when none could be determined).
+    """
+    plot_positions: np.ndarray
+    road_positions: np.ndarray
+    access_index: int = -1
+    road_side: Optional[LineString] = None
+    frontage_length: float = 0.0
+
+    @property
+    def has_road_neighbors(self) -> bool:
+        return len(self.plot_positions) > 0
+
+    @property
+    def has_access_road(self) -> bool:
+        return self.access_index >= 0
+
+class RoadAccessCache:
+    """Bounded LRU cache of resolved road access keyed by (plot gml_id, plot position, version)
+
+    The position is the plot's position in the plot layer (-1 for a geometry that is not one
+    of its plots), so plots sharing a gml_id are kept apart. The version identifies the plot and
+    road layers and how the access was resolved (see RoadAccessService.resolution_version).
+
+    One cache is shared by all road access services of a process (ROAD_ACCESS_CACHE), so
+    every analysis reuses the resolutions of earlier ones. It can be saved to and loaded
+    from a Parquet file to carry resolutions across runs.
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Hashable, RoadAccess]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, plot_id, position: int, version: str) -> Optional[RoadAccess]:
+        """Cached road access of a plot, marking it as most recently used"""
+        key = (plot_id, int(position), version)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, plot_id, position: int, version: str, entry: RoadAccess):
+        """Store the road access of a plot, evicting the least recently used entries beyond maxsize"""
+        key = (plot_id, int(position), version)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def keys(self) -> List[Hashable]:
+        """Keys (plot_id, position, version) of all entries, least recently used first"""
+        return list(self._entries)
+    
+    def peek(self, key: Hashable) -> Optional[RoadAccess]:
+        """Entry under a key, without counting a hit or changing its recency"""
+        return self._entries.get(key)
+    
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def save(self, path: str):
+        """Write all entries to a Parquet file, least recently used first"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        keys = list(self._entries)
+        entries = list(self._entries.values())
+        road_sides = [entry.road_side for entry in entries]
+        pd.DataFrame({
+            'plot_id': [plot_id for plot_id, _, _ in keys],
+            'position': np.array([position for _, position, _ in keys], dtype=np.int64),
+            'version': [version for _, _, version in keys],
+            'plot_positions': [entry.plot_positions.tolist() for entry in entries],
+            'road_positions': [entry.road_positions.tolist() for entry in entries],
+            'access_index': np.array([entry.access_index for entry in entries], dtype=np.int64),
+            'road_side': shapely.to_wkb(np.array(road_sides, dtype=object)) if entries else [],
+            'frontage_length': np.array([entry.frontage_length for entry in entries], dtype=float)
+        }).to_parquet(path, index=False)
+
+    def load(self, path: str):
+        """Add the entries of a file written by save (entries already in memory take precedence)"""
+        saved = pd.read_parquet(path)
+        if 'position' not in saved:
+            print(f"Ignoring road access entries in {path}, written without plot positions")
+            return
+        road_sides = shapely.from_wkb(saved['road_side'].to_numpy())
+        entries = OrderedDict()
+        for row, road_side in zip(saved.itertuples(index=False), road_sides):
+            entries[(row.plot_id, int(row.position), row.version)] = RoadAccess(
+                plot_positions=np.asarray(row.plot_positions, dtype=np.intp),
+                road_positions=np.asarray(row.road_positions, dtype=np.intp),
+                access_index=int(row.access_index),
+                road_side=road_side,
+                frontage_length=float(row.frontage_length)
+            )
+        # Loaded entries count as older than the ones in memory, which take precedence
+        for key in self._entries:
+            entries.pop(key, None)
+        entries.update(self._entries)
+        self._entries = entries
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        print(f"Loaded {len(saved)} road access entries from {path}")
+
+# Road access cache shared by all analyses of the process
+ROAD_ACCESS_CACHE = RoadAccessCache()
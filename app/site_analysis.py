@@ -0,0 +1,112 @@
+"""Development-conditions analysis of many candidate sites on a process pool.
+
+The read-only layers (plots, roads, buildings) and the structures built over them (plot
+topology, building assignment, metrics table, road access service) are handed to each worker
+once through the pool initializer; with the fork start method they are inherited copy-on-write
+instead of being pickled per task. Only the candidate sites go to the workers and only the
+condition rows and the road access each worker resolved (the sites' and their built-up
+neighbors') come back, to be added to the road access cache of the calling process. A site that cannot be analyzed gets its
+error message in the 'error' column instead of failing the whole run.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from .building_assignment import BuildingAssignment
+from .development_conditions import CONDITION_COLUMNS, DevelopmentConditions, PlotMetricsTable, RoadAccessService
+from .road_access_cache import RoadAccess
+from .topology import PlotTopology
+
+SITE_ANALYSIS_COLUMNS = ['rank', 'plot_id'] + CONDITION_COLUMNS + ['error']
+
+@dataclass
+class AnalysisContext:
+    """Layers and shared structures every site analysis reads"""
+    plots: gpd.GeoDataFrame
+    roads: gpd.GeoDataFrame
+    buildings: gpd.GeoDataFrame
+    topology: Optional[PlotTopology] = None
+    metrics_table: Optional[PlotMetricsTable] = None
+    road_access: Optional[RoadAccessService] = None
+    building_assignment: Optional[BuildingAssignment] = None
+
+# Analysis context shared by all sites analyzed in a worker process
+_worker_context = None
+
+def _init_worker(context: AnalysisContext):
+    """Receive the analysis context once per worker process"""
+    global _worker_context
+    _worker_context = context
+
+def analyze_site(context: AnalysisContext, site, verbose: bool = False) -> Dict:
+    """Development conditions of one site as a table row
+
+    The row holds the error message (and NaN conditions) when the site could not be analyzed.
+    """
+    development = DevelopmentConditions(
+        site_candidate=site,
+        plots_gdf=context.plots,
+        roads_gdf=context.roads,
+        buildings_gdf=context.buildings,
+        topology=context.topology,
+        metrics_table=context.metrics_table,
+        road_access=context.road_access,
+        building_assignment=context.building_assignment,
+        verbose=verbose
+    )
+    row = {'plot_id': development.site_id(), **dict.fromkeys(CONDITION_COLUMNS, np.nan), 'error': None}
+    try:
+        row.update(development.analyze())
+    except Exception as e:
+        row['error'] = str(e) or type(e).__name__
+    return row
+
+def _analyze_site_in_worker(site) -> Tuple[Dict, List[Tuple[Tuple, RoadAccess]]]:
+    """Row of a site and the road access entries resolved while analyzing it"""
+    cache = _worker_context.road_access.cache
+    known = set(cache.keys())
+    row = analyze_site(_worker_context, site)
+    return row, [(key, cache.peek(key)) for key in cache.keys() if key not in known]
+
+def analyze_sites(sites: Iterable, plots_gdf: gpd.GeoDataFrame, roads_gdf: gpd.GeoDataFrame,
+                  buildings_gdf: gpd.GeoDataFrame, topology: Optional[PlotTopology] = None,
+                  metrics_table: Optional[PlotMetricsTable] = None,
+                  road_access: Optional[RoadAccessService] = None,
+                  building_assignment: Optional[BuildingAssignment] = None,
+                  max_workers: Optional[int] = None) -> pd.DataFrame:
+    """Development conditions of the sites (e.g. the top N candidates) in input order
+
+    Road access resolved by the workers (of the sites and of the built-up plots around them)
+    is added to the road access cache of this process.
+    """
+    sites = list(sites)
+    if road_access is None or not road_access.covers(plots_gdf, roads_gdf):
+        road_access = RoadAccessService.shared(plots_gdf, roads_gdf)
+    context = AnalysisContext(plots_gdf, roads_gdf, buildings_gdf, topology, metrics_table, road_access,
+                              building_assignment)
+    # Hash the layers once here rather than in every worker
+    road_access.prepare()
+    max_workers = min(max_workers or os.cpu_count() or 1, max(len(sites), 1))
+    print(f"\nAnalyzing development conditions of {len(sites)} sites with {max_workers} workers...")
+
+    if max_workers == 1:
+        rows = [analyze_site(context, site) for site in sites]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(context,)) as executor:
+            results = list(executor.map(_analyze_site_in_worker, sites))
+        rows = [row for row, _ in results]
+        for _, resolved in results:
+            for key, entry in resolved:
+                road_access.cache.put(*key, entry)
+
+    for rank, row in enumerate(rows, 1):
+        row['rank'] = rank
+    failed = sum(row['error'] is not None for row in rows)
+    if failed:
+        print(f"Could not analyze development conditions of {failed} of {len(sites)} sites")
+    return pd.DataFrame(rows, columns=SITE_ANALYSIS_COLUMNS)
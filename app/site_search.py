@@ -1,12 +1,20 @@
+import copy
+
 import geopandas as gpd
 import pandas as pd
 import numpy as np
-import contextily as ctx
-import matplotlib.pyplot as plt
-from typing import List, Optional
-from shapely.geometry import Polygon
-import rasterio
-from .models import RetirementHome, SiteConstraints, SitePenaltyWeights, SiteCandidate, NormalizationRanges
+from typing import Callable, Optional, Sequence, Tuple
+from .models import (RetirementHome, SiteConstraints, SitePenaltyWeights, SiteCandidate, SiteCandidateSet,
+                     NormalizationRanges, METRIC_COLUMNS, PENALTY_COLUMNS, weight_matrix, top_k_positions)
+from .spatial import NearestFeatureIndex, anti_join, semi_join_mask
+from .ranking_stability import ranking_stability
+from .tiling import search_tiles
+from .metric_cache import MetricCache, layer_fingerprint, file_fingerprint
+from .raster import RasterSampler
+from .noise import NoiseExposure
+from .constraints import ConstraintEngine
+from .layers import STORE_DIR, LayerBundle, load_bundle
+from . import figures
 
 class SiteSearch:
     def __init__(self, 
@@ -16,8 +24,12 @@ class SiteSearch:
                  churches_gdf: gpd.GeoDataFrame,
                  green_areas_gdf: gpd.GeoDataFrame,
                  noise_map_gdf: gpd.GeoDataFrame,
-                 senior_density_raster_path: str):
-        """Initialize with all required geodataframes for site search"""
+                 senior_density_raster_path: str,
+                 metric_cache: Optional[MetricCache] = None):
+        """Initialize with all required geodataframes for site search
+        
+        With a metric_cache, per-plot metrics are reused across runs while the input layers are unchanged.
+        """
         self.plots = plots_gdf
         self.roads = roads_gdf
         self.buildings = buildings_gdf
@@ -25,235 +37,409 @@ class SiteSearch:
         self.green_areas = green_areas_gdf
         self.noise_map = noise_map_gdf
         self.senior_density_path = senior_density_raster_path
+        self.metric_cache = metric_cache
+        
+        # Optional PlotTopology of these plots and roads; road access then becomes an index lookup
+        self.topology = None
+        
+        # Optional region of interest: only plots intersecting it are sites, the other plots
+        # (and the rest of the layers) are context for their constraints
+        self.region = None
+        
+        # Senior density per plot: 'centroid' samples one pixel, 'mean' / 'max' aggregate over the plot
+        self.senior_density_stat = 'centroid'
+        self._senior_sampler = None
+        
+        # Noise per plot: 'mean' averages intersecting polygons (50 dB outside the map), 'area_mean'
+        # weights levels by area, 'max' or a percentile such as 'p90' give peak exposure (see NoiseExposure)
+        self.noise_stat = 'mean'
+        self._noise_exposure = None
         
         # Set default constraints and weights
         self.constraints = SiteConstraints()
+        self.constraint_engine = ConstraintEngine()
+        self.constraint_report = None
         self.weights = SitePenaltyWeights()
+        
+        # Nearest-feature indexes are built on first use and reused across runs
+        self._nearest_indexes = {}
+        self._fingerprints = {}
+        
+        # Results of the last search, kept for re-ranking
+        self.candidates = None
+        self.norm_ranges = None
+        
+        # Print progress of the individual search stages
+        self.verbose = True
     
-    def find_candidates(self) -> List[SiteCandidate]:
-        """Find and rank potential sites based on constraints and scoring"""
-        candidates = []
+    @classmethod
+    def from_store(cls, senior_density_raster_path: str, store_dir: str = STORE_DIR, region=None,
+                   metric_cache: Optional[MetricCache] = None) -> 'SiteSearch':
+        """Create a site search over the layers of the ingested store (see app.layers.ingest_layers)
         
+        Layers whose source changed since ingest are read from the source files instead.
+        """
+        return cls.from_bundle(load_bundle(senior_density_raster_path, region=region, store_dir=store_dir), metric_cache)
+    
+    @classmethod
+    def from_bundle(cls, bundle: LayerBundle, metric_cache: Optional[MetricCache] = None) -> 'SiteSearch':
+        """Create a site search over concurrently loaded layers (see app.layers.load_bundle)"""
+        search = cls(
+            plots_gdf=bundle.plots,
+            roads_gdf=bundle.roads,
+            buildings_gdf=bundle.buildings,
+            churches_gdf=bundle.churches,
+            green_areas_gdf=bundle.green_areas,
+            noise_map_gdf=bundle.noise_map,
+            senior_density_raster_path=bundle.senior_density_path,
+            metric_cache=metric_cache
+        )
+        search._senior_sampler = bundle.senior_density
+        search.region = bundle.region
+        return search
+    
+    def __getstate__(self):
+        """Drop indexes and results when pickling; workers rebuild indexes on first use"""
+        state = self.__dict__.copy()
+        state['_nearest_indexes'] = {}
+        state['_senior_sampler'] = None
+        state['_noise_exposure'] = None
+        state['candidates'] = None
+        return state
+    
+    def _log(self, message: str):
+        """Print a progress message in verbose mode"""
+        if self.verbose:
+            print(message)
+    
+    def find_candidates(self) -> SiteCandidateSet:
+        """Find and rank potential sites based on constraints and scoring"""
         # Apply hard constraints
-        potential_sites = self._apply_hard_constraints()
+        potential_sites = self._in_plot_order(self._apply_hard_constraints())
         if potential_sites.empty:
             print("No potential sites found after applying hard constraints")
-            return []
+            return SiteCandidateSet.from_candidates([])
         print(f"\nFound {len(potential_sites)} sites after applying hard constraints")
         
-        # Create GeoDataFrame with centroids for efficient distance calculations
-        potential_centroids = gpd.GeoDataFrame(
-            geometry=potential_sites.geometry.centroid,
-            crs=potential_sites.crs
-        )
+        # Calculate all metrics for all sites at once
+        metrics = self._calculate_metrics(potential_sites)
         
-        # Calculate all distances efficiently using GeoSeries operations
-        print("\nCalculating distances...")
+        return self._rank_candidates(potential_sites, metrics, NormalizationRanges.from_metrics(metrics))
+    
+    def find_candidates_tiled(self, tile_size: float = 2000.0, halo: float = 1.0,
+                              max_workers: Optional[int] = None) -> SiteCandidateSet:
+        """Find and rank potential sites by processing spatial tiles of plots on a process pool
         
-        # Green areas distances
-        green_distances = potential_centroids.geometry.apply(
-            lambda x: self.green_areas.distance(x).min()
-        )
-        print(f"Green areas distance range: {green_distances.min():.1f} - {green_distances.max():.1f} meters")
+        Gives the same result as find_candidates; see app.tiling for how tiles are built.
+        Tile workers do not read or write the metric cache.
+        """
+        potential_sites, metrics, norm_ranges, self.constraint_report = search_tiles(self, tile_size, halo, max_workers)
+        if potential_sites.empty:
+            print("No potential sites found after applying hard constraints")
+            return SiteCandidateSet.from_candidates([])
+        print(f"\nFound {len(potential_sites)} sites after applying hard constraints")
         
-        # Church distances
-        church_distances = potential_centroids.geometry.apply(
-            lambda x: self.churches.distance(x).min()
-        )
-        print(f"Church distance range: {church_distances.min():.1f} - {church_distances.max():.1f} meters")
-        
-        # Calculate noise levels using spatial join
-        print("\nCalculating noise levels...")
-        noise_data = gpd.sjoin(
-            potential_sites[['geometry']],
-            self.noise_map[['geometry', 'min_noise']],
-            predicate='intersects'
-        )
-        noise_levels = noise_data.groupby(level=0)['min_noise'].mean().fillna(50)
-        print(f"Noise level range: {noise_levels.min():.1f} - {noise_levels.max():.1f} dB")
-        
-        # Calculate senior density for all points at once
-        print("\nCalculating senior density...")
-        with rasterio.open(self.senior_density_path) as src:
-            senior_densities = [
-                round(val[0], 1) 
-                for val in src.sample([(p.x, p.y) for p in potential_centroids.geometry])
-            ]
-        senior_series = pd.Series(senior_densities)
-        print(f"Senior density range: {senior_series.min():.1f}% - {senior_series.max():.1f}%")
-        
-        # Create normalization ranges
-        self.norm_ranges = NormalizationRanges(
-            min_green_distance=float(green_distances.min()),
-            max_green_distance=float(green_distances.max()),
-            min_church_distance=float(church_distances.min()),
-            max_church_distance=float(church_distances.max()),
-            min_noise=float(50),
-            max_noise=float(noise_levels.max()),
-            min_senior=float(senior_series.min()),
-            max_senior=float(senior_series.max())
-        )
+        return self._rank_candidates(potential_sites, metrics, norm_ranges)
+    
+    def _rank_candidates(self, potential_sites: gpd.GeoDataFrame, metrics: pd.DataFrame,
+                         norm_ranges: NormalizationRanges) -> SiteCandidateSet:
+        """Score and sort candidates from precomputed metrics and keep them for re-ranking"""
+        self.norm_ranges = norm_ranges
         
+        print(f"\nNoise level statistic: {self.noise_stat}")
         print("\nNormalization ranges:")
         for field, value in self.norm_ranges.__dict__.items():
             print(f"{field}: {value:.1f}")
         
-        # Create candidates using the pre-calculated ranges
+        # Assemble candidates from the pre-calculated metrics and ranges
         print("\nCreating candidates...")
-        for idx, plot in potential_sites.iterrows():
-            candidate = self._create_candidate(plot)
-            if candidate is not None:
-                candidates.append(candidate)
-        
-        # Sort by score in descending order (higher is better)
-        candidates.sort(key=lambda x: x.score)
+        candidates = self._build_candidates(potential_sites, metrics)
         print(f"\nCreated {len(candidates)} valid candidates")
         
-        
+        self.candidates = candidates
         return candidates
     
-    def _apply_hard_constraints(self) -> gpd.GeoDataFrame:
-        """Apply hard constraints to find potential sites"""
-        # Filter by area using geometry.area directly
-        sized_plots = self.plots[
-            (self.plots.geometry.area >= self.constraints.min_plot_area) & 
-            (self.plots.geometry.area <= self.constraints.max_plot_area)
-        ]
-        
-        # Calculate shape index
-        sized_plots['shape_index'] = sized_plots.geometry.apply(self._calculate_shape_index)
-        shaped_plots = sized_plots[sized_plots['shape_index'] >= self.constraints.min_shape_index]
+    def rerank(self, weights: SitePenaltyWeights) -> SiteCandidateSet:
+        """Re-score and re-order the last search results for new weights without recomputing metrics"""
+        if self.candidates is None:
+            raise ValueError("Must run find_candidates() before re-ranking")
+        self.weights = weights
+        self.candidates = self.candidates.rescore(weights)
+        return self.candidates
+    
+    def rank_weight_batch(self, weights_batch, n_top: int = 6) -> pd.DataFrame:
+        """Rank the last search results for many weight vectors at once
         
-        # Filter out plots with residential buildings
-        residential_buildings = self.buildings[self.buildings['FUNKCJA'] == 'budynki mieszkalne']
-        plots_with_buildings = gpd.sjoin(
-            shaped_plots, 
-            residential_buildings, 
-            how='inner',
-            rsuffix='_bldg'
+        Returns one row per weight vector with the plot ids of its top N candidates, best first.
+        """
+        if self.candidates is None:
+            raise ValueError("Must run find_candidates() before re-ranking")
+        weights = weight_matrix(weights_batch)
+        top = top_k_positions(self.candidates.score_matrix(weights), n_top)
+        plot_ids = self.candidates.data['plot_id'].to_numpy()[top]
+        return pd.DataFrame(
+            plot_ids,
+            columns=[f"rank_{i + 1}" for i in range(top.shape[1])],
+            index=pd.MultiIndex.from_arrays(weights.T, names=PENALTY_COLUMNS)
         )
-        empty_plots = shaped_plots[~shaped_plots.index.isin(plots_with_buildings.index)].drop_duplicates(subset='gml_id')
-        
-        # Filter by road accessibility
-        # First join plots with roads
-        road_plots = gpd.sjoin(
-            self.plots,
-            self.roads,
-            how='inner',
-            predicate='intersects',
-            rsuffix='_road'
+    
+    def ranking_stability(self, n_samples: int = 10000, top_k: int = 6,
+                          concentration: float = 50.0, seed: Optional[int] = None) -> pd.DataFrame:
+        """Estimate each of the last search results' probability of ranking in the top k
+        when the current penalty weights are uncertain"""
+        if self.candidates is None:
+            raise ValueError("Must run find_candidates() before analyzing ranking stability")
+        return ranking_stability(
+            self.candidates, self.weights,
+            n_samples=n_samples, top_k=top_k, concentration=concentration, seed=seed
         )
+    
+    def _calculate_metrics(self, potential_sites: gpd.GeoDataFrame) -> pd.DataFrame:
+        """Calculate raw scoring metrics for all potential sites, indexed like potential_sites"""
+        # Calculate all distances with one bulk nearest-feature query per layer
+        self._log("\nCalculating distances...")
+        green_distances = self._metric(
+            'distance_to_nearest_green', ['green_areas'], potential_sites,
+            lambda plots: self._distance_metric(plots, self.green_areas, 'distance_to_nearest_green')
+        )['distance_to_nearest_green']
+        self._log(f"Green areas distance range: {green_distances.min():.1f} - {green_distances.max():.1f} meters")
+        church_distances = self._metric(
+            'distance_to_nearest_church', ['churches'], potential_sites,
+            lambda plots: self._distance_metric(plots, self.churches, 'distance_to_nearest_church')
+        )['distance_to_nearest_church']
+        self._log(f"Church distance range: {church_distances.min():.1f} - {church_distances.max():.1f} meters")
         
-        # Then join with empty plots
-        potential_sites = gpd.sjoin(
-            empty_plots,
-            road_plots,
-            how='inner',
-            predicate='touches',
-            rsuffix='_roadplot'
-        ).drop_duplicates(subset='gml_id')  # Remove duplicates from second join
+        self._log("\nCalculating noise levels...")
+        noise_levels = self._metric(
+            f'noise_level_{self.noise_stat}', ['noise_map'], potential_sites, self._noise_metric
+        )['noise_level']
+        self._log(f"Noise level range: {noise_levels.min():.1f} - {noise_levels.max():.1f} dB")
         
-        if potential_sites.empty:
-            print("No potential sites found after applying hard constraints")
-            return gpd.GeoDataFrame(columns=empty_plots.columns, crs=empty_plots.crs)
+        self._log("\nCalculating senior density...")
+        senior_series = self._metric(
+            f'senior_density_{self.senior_density_stat}', ['senior_density'], potential_sites, self._senior_density_metric
+        )['senior_density']
+        self._log(f"Senior density range: {senior_series.min():.1f}% - {senior_series.max():.1f}%")
         
-        # Return deduplicated sites
+        return pd.DataFrame({
+            'distance_to_nearest_green': green_distances,
+            'distance_to_nearest_church': church_distances,
+            'noise_level': noise_levels,
+            'senior_density': senior_series
+        }, index=potential_sites.index)
+    
+    def _metric(self, name: str, layers: Sequence[str], plots: gpd.GeoDataFrame,
+                compute: Callable[[gpd.GeoDataFrame], pd.DataFrame]) -> pd.DataFrame:
+        """Compute a per-plot metric, or serve it from the metric cache when one is set"""
+        if self.metric_cache is None:
+            return compute(plots)
+        fingerprints = [self._layer_fingerprint(layer) for layer in ['plots', *layers]]
+        return self.metric_cache.fetch(name, fingerprints, plots, compute)
+    
+    def _layer_fingerprint(self, layer: str) -> str:
+        """Return the content hash of an input layer, computed once per search"""
+        if layer not in self._fingerprints:
+            if layer == 'senior_density':
+                self._fingerprints[layer] = file_fingerprint(self.senior_density_path)
+            else:
+                self._fingerprints[layer] = layer_fingerprint(getattr(self, layer))
+        return self._fingerprints[layer]
+    
+    def _distance_metric(self, plots: gpd.GeoDataFrame, target_gdf: gpd.GeoDataFrame, column: str) -> pd.DataFrame:
+        """Distance from each plot centroid to the nearest feature of a target layer"""
+        distances = self._get_nearest_index(target_gdf).distances(plots.geometry.centroid.values)
+        return pd.DataFrame({column: distances}, index=plots.index)
+    
+    def _noise_metric(self, plots: gpd.GeoDataFrame) -> pd.DataFrame:
+        """Noise exposure of each plot; plots outside the noise map get 50 dB"""
+        exposure = self._get_noise_exposure().exposure(plots.geometry.values, stats=[self.noise_stat])
+        return pd.DataFrame({'noise_level': exposure[self.noise_stat].to_numpy()}, index=plots.index)
+    
+    def _get_noise_exposure(self) -> NoiseExposure:
+        """Return the noise overlay engine, indexing the noise map on first use"""
+        if self._noise_exposure is None:
+            self._noise_exposure = NoiseExposure(self.noise_map, column='min_noise', default=50)
+        return self._noise_exposure
+    
+    def _senior_density_metric(self, plots: gpd.GeoDataFrame) -> pd.DataFrame:
+        """Senior density at each plot centroid, or aggregated over each plot polygon"""
+        sampler = self._get_senior_sampler()
+        if self.senior_density_stat == 'centroid':
+            densities = sampler.sample_points(plots.geometry.centroid.values)
+        else:
+            densities = sampler.zonal_stats(plots.geometry.values, stats=[self.senior_density_stat])[self.senior_density_stat]
+        return pd.DataFrame({'senior_density': np.round(np.asarray(densities, dtype=float), 1)}, index=plots.index)
+    
+    def _get_senior_sampler(self) -> RasterSampler:
+        """Return the senior density raster sampler, reading the raster on first use"""
+        if self._senior_sampler is None:
+            self._senior_sampler = RasterSampler(self.senior_density_path)
+        return self._senior_sampler
+    
+    def _build_candidates(self, potential_sites: gpd.GeoDataFrame, metrics: pd.DataFrame) -> SiteCandidateSet:
+        """Assemble a scored, sorted candidate set from precomputed metric columns without spatial work"""
+        candidates = self._assemble_candidates(potential_sites, metrics)
+        candidates.calculate_scores(self.weights, self.norm_ranges)
+        
+        # Sort by score in ascending order (lower penalty is better)
+        return candidates.sort_by_score()
+    
+    def _assemble_candidates(self, potential_sites: gpd.GeoDataFrame, metrics: pd.DataFrame) -> SiteCandidateSet:
+        """Unscored candidates in site order from precomputed metric columns, skipping plots with missing metrics"""
+        data = pd.DataFrame({
+            'plot_id': potential_sites['gml_id'].to_numpy(),
+            'area': potential_sites.geometry.area.to_numpy(),
+            'shape_index': potential_sites['shape_index'].to_numpy(),
+            'distance_to_nearest_green': np.round(metrics['distance_to_nearest_green'].to_numpy()),
+            'distance_to_nearest_church': np.round(metrics['distance_to_nearest_church'].to_numpy()),
+            'noise_level': metrics['noise_level'].to_numpy(dtype=float),
+            'senior_density': metrics['senior_density'].to_numpy(dtype=float)
+        })
+        
+        # Skip plots whose metrics could not be determined
+        valid = np.isfinite(data[METRIC_COLUMNS].to_numpy(dtype=float)).all(axis=1)
+        if not valid.all():
+            print(f"Skipping {int((~valid).sum())} plots with missing metrics")
+        
+        return SiteCandidateSet(data[valid], potential_sites.geometry.values[valid])
+    
+    def hard_constraint_sites(self, constraints: Optional[SiteConstraints] = None, record_history: bool = True,
+                              deduplicate: bool = True) -> gpd.GeoDataFrame:
+        """Plots passing the hard constraints, in plot order with their shape index
+        
+        Constraints default to the search's own; other constraints are evaluated on a copy of the
+        search. Without record_history the run does not feed the constraint engine's ordering
+        statistics; without deduplicate every plot of a shared gml_id is kept. The search's
+        constraint_report is left unchanged.
+        """
+        search = self
+        if constraints is not None:
+            search = copy.copy(self)
+            search.constraints = constraints
+        sites, _ = search._constrain(self.site_plots(), record_history, deduplicate)
+        return self._in_plot_order(sites)
+    
+    def _apply_hard_constraints(self, plots: Optional[gpd.GeoDataFrame] = None) -> gpd.GeoDataFrame:
+        """Apply hard constraints to find potential sites
+        
+        Only `plots` (the plots of the region by default) are considered as sites; the full
+        plot layer is still used to find neighboring road plots. Per-constraint rejection
+        counts and timings are kept in self.constraint_report.
+        """
+        if plots is None:
+            plots = self.site_plots()
+        potential_sites, self.constraint_report = self._constrain(plots)
         return potential_sites
     
-    def _calculate_shape_index(self, geometry: Polygon) -> float:
-        """Calculate shape regularity index (4πA/P²)"""
-        area = geometry.area
-        perimeter = geometry.length
-        return 4 * np.pi * area / (perimeter ** 2)
-    
-    def _create_candidate(self, plot: gpd.GeoSeries) -> Optional[SiteCandidate]:
-        """Create a SiteCandidate from a plot with all metrics calculated"""
-        try:
-            # Create base candidate
-            candidate = SiteCandidate(
-                plot_id=plot['gml_id'],
-                geometry=plot.geometry,
-                area=plot.geometry.area,
-                shape_index=plot['shape_index'],
-            )
-            
-            # Calculate metrics
-            candidate.distance_to_nearest_church = self._calculate_distance_to_nearest(
-                plot.geometry.centroid, self.churches
-            )
-            
-            candidate.distance_to_nearest_green = self._calculate_distance_to_nearest(
-                plot.geometry.centroid, self.green_areas
-            )
-            
-            # Get noise level and handle NaN values
-            noise_intersections = gpd.sjoin(
-                gpd.GeoDataFrame(geometry=[plot.geometry], crs=self.noise_map.crs),
-                self.noise_map[['geometry', 'min_noise']],
-                predicate='intersects'
-            )
-            candidate.noise_level = noise_intersections['min_noise'].mean() if not noise_intersections.empty else 50
-            
-            # Get senior density
-            with rasterio.open(self.senior_density_path) as src:
-                centroid = plot.geometry.centroid
-                senior_density = list(src.sample([(centroid.x, centroid.y)]))[0][0]
-                candidate.senior_density = round(senior_density, 1)
-            
-            # Calculate score using pre-calculated ranges
-            candidate.calculate_score(self.weights, self.norm_ranges)
-            
-            return candidate
-            
-        except Exception as e:
-            print(f"Error creating candidate for plot {plot['gml_id']}: {str(e)}")
-            return None
+    def site_positions(self) -> np.ndarray:
+        """Positions of the plots that can be sites: those intersecting the region (all plots without one)"""
+        if self.region is None:
+            return np.arange(len(self.plots))
+        return np.sort(self.plots.sindex.query(self.region, predicate='intersects'))
+    
+    def site_plots(self) -> gpd.GeoDataFrame:
+        """Plots that can be sites, in plot order"""
+        return self.plots if self.region is None else self.plots.iloc[self.site_positions()]
+    
+    def _constrain(self, plots: gpd.GeoDataFrame, record_history: bool = True,
+                   deduplicate: bool = True) -> Tuple[gpd.GeoDataFrame, pd.DataFrame]:
+        """Plots passing the hard constraints (the first plot of each gml_id) and the per-constraint report"""
+        passed, report = self.constraint_engine.apply(self, plots, record_history)
+        for row in report.itertuples():
+            self._log(f"Constraint {row.constraint}: rejected {row.rejected} of {row.evaluated} plots ({row.seconds:.3f}s)")
+        
+        potential_sites = passed.drop_duplicates(subset='gml_id') if deduplicate else passed
+        potential_sites = potential_sites.assign(
+            shape_index=self._metric('shape_index', [], potential_sites, self._shape_index_metric)['shape_index']
+        )
+        
+        if potential_sites.empty:
+            self._log("No potential sites found after applying hard constraints")
+        
+        return potential_sites, report
+    
+    def _shape_index_metric(self, plots: gpd.GeoDataFrame) -> pd.DataFrame:
+        """Shape regularity index (4πA/P²) of each plot"""
+        return pd.DataFrame(
+            {'shape_index': 4 * np.pi * plots.geometry.area / (plots.geometry.length ** 2)}, index=plots.index
+        )
+    
+    def _residential_building_metric(self, plots: gpd.GeoDataFrame) -> pd.DataFrame:
+        """Whether each plot intersects a residential building"""
+        residential_buildings = self.buildings[self.buildings['FUNKCJA'] == 'budynki mieszkalne']
+        has_residential_building = np.ones(len(plots), dtype=bool)
+        has_residential_building[anti_join(plots.reset_index(drop=True), residential_buildings).index] = False
+        return pd.DataFrame({'has_residential_building': has_residential_building}, index=plots.index)
+    
+    def _road_access_metric(self, plots: gpd.GeoDataFrame) -> pd.DataFrame:
+        """Whether each plot touches a plot that intersects a road"""
+        if self.topology is not None:
+            positions = self.topology.positions(plots.index)
+            if (positions >= 0).all():
+                return pd.DataFrame(
+                    {'has_road_access': self.topology.has_road_neighbor(positions)}, index=plots.index
+                )
+        
+        # Only neighbors of the candidate plots need to be checked against the roads
+        plot_positions, neighbor_positions = self.plots.sindex.query(plots.geometry.values, predicate='touches')
+        neighbors = np.unique(neighbor_positions)
+        road_plot = np.zeros(len(self.plots), dtype=bool)
+        road_plot[neighbors] = semi_join_mask(self.plots.iloc[neighbors], self.roads)
+        has_road_access = np.bincount(plot_positions[road_plot[neighbor_positions]], minlength=len(plots)) > 0
+        return pd.DataFrame({'has_road_access': has_road_access}, index=plots.index)
+    
+    def _road_distance_metric(self, plots: gpd.GeoDataFrame) -> pd.DataFrame:
+        """Distance from each plot to the nearest road"""
+        return pd.DataFrame(
+            {'distance_to_road': self._get_nearest_index(self.roads).distances(plots.geometry.values)}, index=plots.index
+        )
     
-    def _calculate_distance_to_nearest(self, point, target_gdf: gpd.GeoDataFrame) -> float:
-        """Calculate distance to nearest feature in target geodataframe"""
-        distances = [point.distance(geom) for geom in target_gdf.geometry]
-        return round(min(distances))
+    def _in_plot_order(self, sites: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+        """Reorder sites to follow the order of the plot layer"""
+        return sites.iloc[np.argsort(self.plots.index.get_indexer(sites.index), kind='stable')]
     
-    def visualize_candidates(self, candidates: List[SiteCandidate], n_top: int = 6):
-        """Visualize top N candidates on a map"""
+    def _get_nearest_index(self, target_gdf: gpd.GeoDataFrame) -> NearestFeatureIndex:
+        """Return the cached nearest-feature index for a target layer, building it on first use"""
+        index = self._nearest_indexes.get(id(target_gdf))
+        if index is None or index.features is not target_gdf:
+            index = NearestFeatureIndex(target_gdf)
+            self._nearest_indexes[id(target_gdf)] = index
+        return index
+    
+    def visualize_candidates(self, candidates: SiteCandidateSet, n_top: int = 6):
+        """Visualize top N candidates on a map (saved to files in headless mode, see app.figures)"""
+        plt = figures.pyplot()
+        ctx = figures.contextily()
+        
         # Create figure
         fig, ax = plt.subplots(figsize=(12, 8))
         
-        # Convert penalties to percentage scores (0 penalty = 100%, 1 penalty = 0%)
-        display_scores = [(1 - c.score) * 100 for c in candidates]
-        
         # Create GeoDataFrame from candidates
-        candidate_gdf = gpd.GeoDataFrame(
-            geometry=[c.geometry for c in candidates],
-            data={
-                'score': display_scores,
-                'plot_id': [c.plot_id for c in candidates]
-            },
-            crs=self.plots.crs
-        )
+        candidate_gdf = candidates.to_geodataframe(crs=self.plots.crs)
+        
+        # Convert penalties to percentage scores (0 penalty = 100%, 1 penalty = 0%)
+        candidate_gdf['display_score'] = (1 - candidate_gdf['score']) * 100
+        top_candidates = candidate_gdf.iloc[:n_top]
+        other_candidates = candidate_gdf.iloc[n_top:]
         
         # Plot all candidates with transparency
-        for idx, (candidate, display_score) in enumerate(zip(candidates, display_scores)):
-            color = 'red' if idx < n_top else 'gray'
-            alpha = 0.8 if idx < n_top else 0.2
-            gpd.GeoSeries([candidate.geometry]).plot(
-                ax=ax,
-                color=color,
-                alpha=alpha
+        if not other_candidates.empty:
+            other_candidates.plot(ax=ax, color='gray', alpha=0.2)
+        if not top_candidates.empty:
+            top_candidates.plot(ax=ax, color='red', alpha=0.8)
+        
+        # Add labels for top candidates
+        for idx, candidate in enumerate(top_candidates.itertuples()):
+            centroid = candidate.geometry.centroid
+            ax.annotate(
+                f"#{idx+1}\nScore: {candidate.display_score:.0f}%\n"
+                f"Area: {candidate.area:.0f}m²\n"
+                f"Seniors: {candidate.senior_density:.1f}%",
+                xy=(centroid.x, centroid.y),
+                ha='center',
+                va='center',
+                fontsize=8
             )
-            
-            # Add labels for top candidates
-            if idx < n_top:
-                centroid = candidate.geometry.centroid
-                ax.annotate(
-                    f"#{idx+1}\nScore: {display_score:.0f}%\n"
-                    f"Area: {candidate.area:.0f}m²\n"
-                    f"Seniors: {candidate.senior_density:.1f}%",
-                    xy=(centroid.x, centroid.y),
-                    ha='center',
-                    va='center',
-                    fontsize=8
-                )
         
         # Add basemap with explicit CRS
         ctx.add_basemap(
@@ -264,14 +450,15 @@ class SiteSearch:
         
         ax.set_axis_off()
         plt.title(f"Top {n_top} Site Candidates")
-        plt.show()
+        figures.show(fig, 'site_candidates')
         
         # Create detail views
         if n_top > 0:
             self.visualize_candidate_details(candidates[:n_top])
     
-    def visualize_candidate_details(self, candidates: List[SiteCandidate]):
+    def visualize_candidate_details(self, candidates: Sequence[SiteCandidate]):
         """Create detailed views of each candidate site"""
+        plt = figures.pyplot()
         buffer_distance = 300  # meters
         
         # Calculate grid dimensions
@@ -327,4 +514,4 @@ class SiteSearch:
             fig.delaxes(axes[idx])
         
         plt.tight_layout()
-        plt.show() 
\ No newline at end of file
+        figures.show(fig, 'site_candidate_details')
\ No newline at end of file
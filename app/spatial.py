@@ -0,0 +1,77 @@
+import geopandas as gpd
+import numpy as np
+import shapely
+from typing import Tuple
+
+class NearestFeatureIndex:
+    """Reusable STRtree over a feature layer for vectorized nearest-feature queries"""
+
+    def __init__(self, features_gdf: gpd.GeoDataFrame):
+        """Build the tree once from the feature geometries"""
+        self.features = features_gdf
+        self.geometries = np.asarray(features_gdf.geometry.values)
+        self.tree = shapely.STRtree(self.geometries)
+
+    def __len__(self) -> int:
+        return len(self.geometries)
+
+    def query(self, geometries) -> Tuple[np.ndarray, np.ndarray]:
+        """Return distance to and position of the nearest feature for every input geometry"""
+        geometries = np.asarray(geometries)
+        distances = np.full(len(geometries), np.inf)
+        nearest = np.full(len(geometries), -1, dtype=np.intp)
+        if len(geometries) == 0 or len(self) == 0:
+            return distances, nearest
+
+        # One bulk query; ties resolve to the first feature so results are deterministic
+        (input_idx, tree_idx), tree_distances = self.tree.query_nearest(
+            geometries, return_distance=True, all_matches=False
+        )
+        distances[input_idx] = tree_distances
+        nearest[input_idx] = tree_idx
+        return distances, nearest
+
+    def distances(self, geometries) -> np.ndarray:
+        """Return distances to the nearest feature for every input geometry"""
+        return self.query(geometries)[0]
+
+    def nearest_ids(self, geometries) -> np.ndarray:
+        """Return index labels of the nearest feature for every input geometry"""
+        _, nearest = self.query(geometries)
+        labels = np.asarray(self.features.index, dtype=object)
+        ids = np.full(len(nearest), None, dtype=object)
+        found = nearest >= 0
+        ids[found] = labels[nearest[found]]
+        return ids
+
+# Predicate that holds for (b, a) whenever the given one holds for (a, b)
+_CONVERSE_PREDICATES = {
+    'intersects': 'intersects', 'touches': 'touches', 'overlaps': 'overlaps', 'crosses': 'crosses',
+    'within': 'contains', 'contains': 'within', 'covers': 'covered_by', 'covered_by': 'covers'
+}
+
+def semi_join_mask(left_gdf: gpd.GeoDataFrame, right_gdf: gpd.GeoDataFrame, predicate: str = 'intersects') -> np.ndarray:
+    """Whether each left row satisfies the predicate with at least one right row
+
+    Uses the index pairs of a spatial index, so no joined frame is built. The index is the
+    right layer's, unless the right layer is the smaller one (e.g. a single area) and the left
+    index exists already or is built in its place.
+    """
+    matches = np.zeros(len(left_gdf), dtype=bool)
+    if len(left_gdf) and len(right_gdf):
+        converse = _CONVERSE_PREDICATES.get(predicate)
+        if (converse is not None and len(right_gdf) < len(left_gdf) and
+                (left_gdf.has_sindex or not right_gdf.has_sindex)):
+            _, left_idx = left_gdf.sindex.query(right_gdf.geometry.values, predicate=converse)
+        else:
+            left_idx, _ = right_gdf.sindex.query(left_gdf.geometry.values, predicate=predicate)
+        matches[left_idx] = True
+    return matches
+
+def semi_join(left_gdf: gpd.GeoDataFrame, right_gdf: gpd.GeoDataFrame, predicate: str = 'intersects') -> gpd.GeoDataFrame:
+    """Left rows matching at least one right row, each once, in left order and with only the left columns"""
+    return left_gdf[semi_join_mask(left_gdf, right_gdf, predicate)]
+
+def anti_join(left_gdf: gpd.GeoDataFrame, right_gdf: gpd.GeoDataFrame, predicate: str = 'intersects') -> gpd.GeoDataFrame:
+    """Left rows matching no right row, in left order"""
+    return left_gdf[~semi_join_mask(left_gdf, right_gdf, predicate)]
@@ -0,0 +1,151 @@
+"""Scenario sweeps over programme parameters with metrics computed once.
+
+Every programme (stories x residents x sqm per resident) maps to a plot-area window through
+RetirementHome.calculate_plot_size_range. ScenarioSweep applies the area-independent hard
+constraints and calculates the scoring metrics once for the plots within the envelope of the
+scenarios' windows, keeps them sorted by area and by shape index, and answers each scenario
+with binary-search range queries on those orders, a per-scenario gml_id deduplication and
+vectorized normalization and scoring. Results match running find_candidates with the
+scenario's constraints when the scenario lies within the envelope. Building the sweep does
+not change the search's constraints or the constraint engine's ordering statistics.
+"""
+from dataclasses import replace
+from itertools import product
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .models import (RetirementHome, NormalizationRanges, SitePenaltyWeights, METRIC_COLUMNS,
+                     calculate_penalties, weighted_score)
+
+def scenario_grid(stories: Iterable[int], residents: Iterable[Union[int, Tuple[int, int]]],
+                  sqm_per_resident: Iterable[float], coverage_ratio: Optional[float] = None) -> pd.DataFrame:
+    """All combinations of programme parameters with their plot-area windows
+
+    Residents are (min, max) ranges or single counts.
+    """
+    rows = []
+    for n_stories, resident_range, sqm in product(stories, residents, sqm_per_resident):
+        min_residents, max_residents = (resident_range if isinstance(resident_range, tuple)
+                                        else (resident_range, resident_range))
+        home = RetirementHome(
+            version='sweep',
+            min_residents=min_residents,
+            max_residents=max_residents,
+            stories=n_stories,
+            sqm_per_resident=sqm
+        )
+        if coverage_ratio is not None:
+            home.coverage_ratio = coverage_ratio
+        min_plot_area, max_plot_area = home.calculate_plot_size_range()
+        rows.append({
+            'stories': n_stories,
+            'min_residents': min_residents,
+            'max_residents': max_residents,
+            'sqm_per_resident': sqm,
+            'min_plot_area': min_plot_area,
+            'max_plot_area': max_plot_area
+        })
+    return pd.DataFrame(rows)
+
+class ScenarioSweep:
+    """Answer many plot-area / shape-index scenarios from one pass of constraints and metrics"""
+
+    def __init__(self, search, min_plot_area: float = 0, max_plot_area: float = np.inf,
+                 min_shape_index: float = -np.inf):
+        """Apply the hard constraints with the area and shape bounds widened to an envelope and compute
+        metrics for the remaining plots
+        
+        The default envelope holds every plot; for_scenarios narrows it to a scenario grid.
+        """
+        # Every plot of a shared gml_id is kept, as which one a scenario selects depends on its window
+        sites = search.hard_constraint_sites(
+            replace(search.constraints, min_plot_area=min_plot_area, max_plot_area=max_plot_area,
+                    min_shape_index=min_shape_index),
+            record_history=False, deduplicate=False
+        )
+        metrics = search._calculate_metrics(sites) if not sites.empty else pd.DataFrame(columns=METRIC_COLUMNS)
+
+        self.areas = sites.geometry.area.to_numpy() if not sites.empty else np.empty(0)
+        self.shape_indexes = sites['shape_index'].to_numpy(dtype=float) if not sites.empty else np.empty(0)
+        # Raw metrics set the normalization ranges, rounded candidate metrics are scored
+        self.raw_metrics = metrics[METRIC_COLUMNS].to_numpy(dtype=float)
+        self.candidates = search._assemble_candidates(sites, metrics) if not sites.empty else None
+        self.values = (self.candidates.data[METRIC_COLUMNS].to_numpy(dtype=float)
+                       if self.candidates is not None else np.empty((0, len(METRIC_COLUMNS))))
+        valid = np.isfinite(self.raw_metrics).all(axis=1)
+        self.candidate_index = np.full(len(sites), -1, dtype=np.intp)
+        self.candidate_index[valid] = np.arange(int(valid.sum()))
+        self.plot_ids = pd.factorize(sites['gml_id'])[0] if not sites.empty else np.empty(0, dtype=np.intp)
+        self.weights = search.weights
+        self.min_shape_index = search.constraints.min_shape_index
+
+        # Sorted orders for binary-search range queries
+        self.by_area = np.argsort(self.areas, kind='stable')
+        self.sorted_areas = self.areas[self.by_area]
+        self.by_shape = np.argsort(self.shape_indexes, kind='stable')
+        self.sorted_shapes = self.shape_indexes[self.by_shape]
+        self.shape_rank = np.empty(len(sites), dtype=np.intp)
+        self.shape_rank[self.by_shape] = np.arange(len(sites))
+
+    @classmethod
+    def for_scenarios(cls, search, scenarios: pd.DataFrame) -> 'ScenarioSweep':
+        """Sweep over the envelope of the scenarios' area windows and shape index thresholds"""
+        min_shape_index = (scenarios['min_shape_index'].min() if 'min_shape_index' in scenarios
+                           else search.constraints.min_shape_index)
+        return cls(search, scenarios['min_plot_area'].min(), scenarios['max_plot_area'].max(), min_shape_index)
+    
+    def __len__(self) -> int:
+        return len(self.areas)
+
+    def select(self, min_plot_area: float, max_plot_area: float, min_shape_index: Optional[float] = None) -> np.ndarray:
+        """Positions (in plot order) of the sites within the area window and above the shape index
+        
+        Like find_candidates, only the first selected plot of each gml_id is kept. The shape
+        index threshold defaults to the one of the search's constraints.
+        """
+        if min_shape_index is None:
+            min_shape_index = self.min_shape_index
+        lo = np.searchsorted(self.sorted_areas, min_plot_area, side='left')
+        hi = np.searchsorted(self.sorted_areas, max_plot_area, side='right')
+        cutoff = np.searchsorted(self.sorted_shapes, min_shape_index, side='left')
+        positions = self.by_area[lo:hi]
+        positions = np.sort(positions[self.shape_rank[positions] >= cutoff])
+        _, first = np.unique(self.plot_ids[positions], return_index=True)
+        return positions[np.sort(first)]
+
+    def evaluate(self, min_plot_area: float, max_plot_area: float, min_shape_index: Optional[float] = None,
+                 weights: Optional[SitePenaltyWeights] = None, top_k: int = 6) -> Dict:
+        """Candidate count and top-k plots of one scenario"""
+        positions = self.select(min_plot_area, max_plot_area, min_shape_index)
+        candidates = self.candidate_index[positions]
+        candidates = candidates[candidates >= 0]
+        result = {'sites': len(positions), 'candidates': len(candidates),
+                  'best_plot_id': None, 'best_score': np.nan, 'top_plot_ids': []}
+        if len(candidates) == 0:
+            return result
+
+        raw = self.raw_metrics[positions]
+        with np.errstate(invalid='ignore'):
+            minima, maxima = np.nanmin(raw, axis=0), np.nanmax(raw, axis=0)
+        ranges = NormalizationRanges.from_arrays(minima, maxima)
+        values = self.values[candidates]
+        scores = weighted_score(
+            calculate_penalties(values[:, 0], values[:, 1], values[:, 2], values[:, 3], ranges),
+            weights or self.weights
+        )
+        order = np.argsort(scores, kind='stable')[:top_k]
+        top_ids = self.candidates.data['plot_id'].to_numpy()[candidates[order]]
+        result.update(best_plot_id=top_ids[0], best_score=float(scores[order[0]]), top_plot_ids=list(top_ids))
+        return result
+
+    def run(self, scenarios: pd.DataFrame, weights: Optional[SitePenaltyWeights] = None, top_k: int = 6) -> pd.DataFrame:
+        """Evaluate every scenario row (min_plot_area, max_plot_area and optionally min_shape_index)"""
+        has_shape = 'min_shape_index' in scenarios
+        results = [
+            self.evaluate(row['min_plot_area'], row['max_plot_area'],
+                          row['min_shape_index'] if has_shape else None, weights, top_k)
+            for row in scenarios.to_dict('records')
+        ]
+        return pd.concat([scenarios.reset_index(drop=True), pd.DataFrame(results)], axis=1)
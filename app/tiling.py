@@ -0,0 +1,127 @@
+"""Tiled, multi-process execution of the site search.
+
+The plots that can be sites (see SiteSearch.site_positions) are partitioned into square
+tiles by centroid. Each tile is searched by a worker process against the subsets of the
+other layers it can interact with:
+
+- plots and roads intersecting the tile's plot bounds (plus a halo), so plots touching a
+  tile plot and the roads crossing them are visible even when they belong to another tile;
+- buildings intersecting the tile's plot bounds;
+- the shared church, green area and noise indexes and the senior density raster.
+
+Normalization ranges are computed once from the merged metrics, after plots sharing a gml_id
+across tiles are reduced to the first one, so they are exactly the ranges of the serial search.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+
+from .constraints import merge_reports
+from .models import NormalizationRanges
+
+# Site search shared by all tiles processed in a worker process
+_worker_search = None
+
+def partition_plots(plots_gdf: gpd.GeoDataFrame, tile_size: float) -> List[np.ndarray]:
+    """Group plot positions into square tiles by centroid, in plot order within each tile"""
+    if plots_gdf.empty:
+        return []
+    centroids = plots_gdf.geometry.centroid
+    minx, miny = plots_gdf.total_bounds[:2]
+    cols = np.floor((centroids.x.to_numpy() - minx) / tile_size).astype(np.int64)
+    rows = np.floor((centroids.y.to_numpy() - miny) / tile_size).astype(np.int64)
+    tile_keys = rows * (cols.max() + 1) + cols
+    order = np.argsort(tile_keys, kind='stable')
+    boundaries = np.flatnonzero(np.diff(tile_keys[order])) + 1
+    return np.split(order, boundaries)
+
+def _layer_within(layer_gdf: gpd.GeoDataFrame, bounds) -> gpd.GeoDataFrame:
+    """Return the features of a layer intersecting a bounding box"""
+    return layer_gdf.iloc[np.sort(layer_gdf.sindex.query(box(*bounds)))]
+
+def _expand(bounds, margin: float):
+    minx, miny, maxx, maxy = bounds
+    return (minx - margin, miny - margin, maxx + margin, maxy + margin)
+
+def _init_worker(search):
+    """Receive the site search once per worker process"""
+    global _worker_search
+    search.verbose = False
+    _worker_search = search
+
+def search_tile(search, positions: np.ndarray, halo: float) -> Tuple[gpd.GeoDataFrame, pd.DataFrame, pd.DataFrame]:
+    """Apply hard constraints and calculate metrics for the plots of one tile"""
+    # Imported here because site_search imports this module
+    from .site_search import SiteSearch
+
+    core = search.plots.iloc[positions]
+    core_bounds = _expand(core.total_bounds, halo)
+    context_plots = _layer_within(search.plots, core_bounds)
+
+    tile_search = SiteSearch(
+        plots_gdf=context_plots,
+        roads_gdf=_layer_within(search.roads, _expand(context_plots.total_bounds, halo)),
+        buildings_gdf=_layer_within(search.buildings, core_bounds),
+        churches_gdf=search.churches,
+        green_areas_gdf=search.green_areas,
+        noise_map_gdf=search.noise_map,
+        senior_density_raster_path=search.senior_density_path
+    )
+    tile_search.constraints = search.constraints
+    tile_search.constraint_engine = search.constraint_engine
+    tile_search.senior_density_stat = search.senior_density_stat
+    tile_search.verbose = False
+    tile_search.noise_stat = search.noise_stat
+    tile_search.topology = search.topology
+    # Share the nearest-feature indexes, noise index and raster sampler across tiles
+    tile_search._nearest_indexes = search._nearest_indexes
+    tile_search._noise_exposure = search._get_noise_exposure()
+    tile_search._senior_sampler = search._get_senior_sampler()
+
+    potential_sites = tile_search._apply_hard_constraints(core)
+    report = tile_search.constraint_report
+    if potential_sites.empty:
+        return potential_sites, pd.DataFrame(), report
+    return potential_sites, tile_search._calculate_metrics(potential_sites), report
+
+def _search_tile_in_worker(positions: np.ndarray, halo: float):
+    return search_tile(_worker_search, positions, halo)
+
+def search_tiles(search, tile_size: float = 2000.0, halo: float = 1.0, max_workers: Optional[int] = None
+                 ) -> Tuple[gpd.GeoDataFrame, pd.DataFrame, Optional[NormalizationRanges], pd.DataFrame]:
+    """Search all tiles on a process pool and merge the results in plot order
+    
+    Also returns the normalization ranges of the merged sites (None when there are none) and
+    the per-constraint report summed over all tiles.
+    """
+    sites = search.site_positions()
+    tiles = [sites[tile] for tile in partition_plots(search.plots.iloc[sites], tile_size)]
+    max_workers = max_workers or os.cpu_count() or 1
+    print(f"\nSearching {len(tiles)} tiles with {max_workers} workers...")
+
+    if max_workers == 1:
+        results = [search_tile(search, positions, halo) for positions in tiles]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(search,)) as executor:
+            results = list(executor.map(_search_tile_in_worker, tiles, [halo] * len(tiles)))
+
+    non_empty = [(sites, metrics) for sites, metrics, _ in results if not sites.empty]
+    report = merge_reports([report for _, _, report in results])
+    if not non_empty:
+        return gpd.GeoDataFrame(geometry=[], crs=search.plots.crs), pd.DataFrame(), None, report
+
+    potential_sites = pd.concat([sites for sites, _ in non_empty])
+    metrics = pd.concat([metrics for _, metrics in non_empty])
+    order = np.argsort(search.plots.index.get_indexer(potential_sites.index), kind='stable')
+    potential_sites = potential_sites.iloc[order]
+    metrics = metrics.iloc[order]
+
+    # Plots sharing a gml_id may fall into different tiles; keep the first like the serial search
+    unique = ~potential_sites['gml_id'].duplicated().to_numpy()
+    metrics = metrics[unique]
+    return potential_sites[unique], metrics, NormalizationRanges.from_metrics(metrics), report
@@ -0,0 +1,117 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import LineString
+from typing import Optional
+
+class PlotTopology:
+    """Shared-edge index of a cadastral plot layer, built once per dataset
+
+    Two plots are neighbors when they touch, the predicate of the geometric road neighbor
+    lookup; with snap_gaps they are neighbors when they lie within `tolerance` of each
+    other, which also snaps small digitizing gaps (and so no longer matches the geometric
+    lookup). For every ordered neighbor pair (plot, neighbor) the shared edge is the part of
+    the plot boundary within `tolerance` of the neighbor, the same construction
+    get_road_side uses. When a road layer is given, the plots intersecting
+    each road and the length of that intersection are indexed as well.
+
+    Plots are addressed by position in the plot layer; neighbors of position i are
+    neighbor_positions[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, plots_gdf: gpd.GeoDataFrame, roads_gdf: Optional[gpd.GeoDataFrame] = None,
+                 tolerance: float = 0.1, snap_gaps: bool = False):
+        self.plots = plots_gdf
+        self.roads = roads_gdf
+        self.tolerance = tolerance
+        self.snap_gaps = snap_gaps
+        self.geometries = np.asarray(plots_gdf.geometry.values)
+        self.tree = shapely.STRtree(self.geometries)
+        n = len(self.geometries)
+
+        # Neighbor pairs in both directions, sorted by plot then neighbor
+        if snap_gaps:
+            left, right = self.tree.query(self.geometries, predicate='dwithin', distance=tolerance)
+        else:
+            left, right = self.tree.query(self.geometries, predicate='touches')
+        keep = left != right
+        order = np.lexsort((right[keep], left[keep]))
+        left, right = left[keep][order], right[keep][order]
+        self.edge_geometries = shapely.intersection(
+            shapely.boundary(self.geometries[left]),
+            shapely.buffer(self.geometries[right], tolerance)
+        )
+        self.edges = pd.DataFrame({
+            'plot': left,
+            'neighbor': right,
+            'shared_length': shapely.length(self.edge_geometries)
+        })
+        self.neighbor_positions = right
+        self.offsets = np.searchsorted(left, np.arange(n + 1))
+        self._edge_lookup = {(int(i), int(j)): k for k, (i, j) in enumerate(zip(left, right))}
+
+        # Plots crossing roads, with the length of the crossing
+        if roads_gdf is not None:
+            road_geometries = np.asarray(roads_gdf.geometry.values)
+            plot_idx, road_idx = shapely.STRtree(road_geometries).query(self.geometries, predicate='intersects')
+            order = np.lexsort((road_idx, plot_idx))
+            plot_idx, road_idx = plot_idx[order], road_idx[order]
+            self.road_edges = pd.DataFrame({
+                'plot': plot_idx,
+                'road': road_idx,
+                'length': shapely.length(shapely.intersection(self.geometries[plot_idx], road_geometries[road_idx]))
+            })
+            self.road_offsets = np.searchsorted(plot_idx, np.arange(n + 1))
+            self.is_road_plot = np.bincount(plot_idx, minlength=n) > 0
+        else:
+            self.road_edges = None
+            self.road_offsets = None
+            self.is_road_plot = None
+
+    def positions(self, labels) -> np.ndarray:
+        """Map plot index labels to positions (-1 for unknown labels)"""
+        return self.plots.index.get_indexer(labels)
+
+    def locate(self, geometry) -> Optional[int]:
+        """Return the position of the plot with exactly this geometry, if any"""
+        for position in self.tree.query(geometry, predicate='covers'):
+            if shapely.equals(self.geometries[position], geometry):
+                return int(position)
+        return None
+
+    def neighbors(self, position: int) -> np.ndarray:
+        """Positions of the plots sharing an edge or corner with a plot"""
+        return self.neighbor_positions[self.offsets[position]:self.offsets[position + 1]]
+
+    def shared_length(self, position: int, neighbor: int) -> float:
+        """Length of a plot's boundary shared with a neighbor (0 if not neighbors)"""
+        edge = self._edge_lookup.get((int(position), int(neighbor)))
+        return 0.0 if edge is None else float(self.edges['shared_length'].iat[edge])
+
+    def shared_edge(self, position: int, neighbor: int) -> Optional[LineString]:
+        """Longest part of a plot's boundary shared with a neighbor, or None when negligible"""
+        edge = self._edge_lookup.get((int(position), int(neighbor)))
+        if edge is None:
+            return None
+        shared = self.edge_geometries[edge]
+        if shared.geom_type in ('MultiLineString', 'GeometryCollection'):
+            lines = [g for g in shared.geoms if g.geom_type == 'LineString']
+            shared = max(lines, key=lambda x: x.length) if lines else LineString()
+        if shared.is_empty or shared.length < 0.01:
+            return None
+        return shared
+
+    def road_frontage(self, position: int) -> pd.DataFrame:
+        """Roads crossing a plot (positions in the road layer) with the crossing length"""
+        if self.road_edges is None:
+            raise ValueError("PlotTopology was built without a road layer")
+        return self.road_edges.iloc[self.road_offsets[position]:self.road_offsets[position + 1]]
+
+    def has_road_neighbor(self, positions: np.ndarray) -> np.ndarray:
+        """Whether each plot has a neighbor crossing a road"""
+        if self.is_road_plot is None:
+            raise ValueError("PlotTopology was built without a road layer")
+        with_road = self.edges['plot'].to_numpy()[self.is_road_plot[self.neighbor_positions]]
+        has_road_neighbor = np.bincount(with_road, minlength=len(self.geometries)) > 0
+        return has_road_neighbor[np.asarray(positions)]
@@ -0,0 +1,28 @@
+import argparse
+from app.batch import BatchRunner, load_specs
+from app.layers import STORE_DIR, load_bundle
+from app.metric_cache import MetricCache
+
+def main():
+    parser = argparse.ArgumentParser(description="Run site search and development analysis for a file of programme specs")
+    parser.add_argument('specs', help="JSON or CSV file of RetirementHome specs")
+    parser.add_argument('--output', default='output/batch', help="Output directory")
+    parser.add_argument('--top', type=int, default=6, help="Number of top sites to analyze per spec")
+    parser.add_argument('--store', default=STORE_DIR, help="Ingested layer store (see ingest.py)")
+    parser.add_argument('--dxf', action='store_true', help="Export development conditions of analyzed sites to DXF")
+    parser.add_argument('--plot-metrics', action='store_true',
+                        help="Precompute the metrics of all built-up plots once and query them per site")
+    args = parser.parse_args()
+    
+    specs = load_specs(args.specs)
+    print(f"Loaded {len(specs)} specs from {args.specs}")
+    
+    # GIS data is loaded once and shared by all specs
+    layers = load_bundle('data/GIS/old_heatmap.tif', store_dir=args.store)
+    runner = BatchRunner(layers, output_dir=args.output, n_top=args.top,
+                         metric_cache=MetricCache('output/cache'), export_dxf=args.dxf,
+                         use_metrics_table=args.plot_metrics)
+    runner.run(specs)
+
+if __name__ == "__main__":
+    main()
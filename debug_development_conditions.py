@@ -1,19 +1,19 @@
-import geopandas as gpd
+from dataclasses import replace
 from app.development_conditions import DevelopmentConditions
+from app.layers import DEFAULT_LAYERS, load_layers, read_layer, region_of_interest
 
 def main():
     # Load required GIS data
     print("Loading GIS data...")
-    plots = gpd.read_file("data/GIS/2261_dzialki_egib_wfs_gml.gml")
-    roads = gpd.read_file("data/GIS/2261_ulice_egib_wfs_gml.gml")
-    buildings = gpd.read_file("data/GIS/budynki_2022.gpkg")
-
-    plots.set_crs(epsg=2177, inplace=True)
-    roads.set_crs(epsg=2177, inplace=True)
-    buildings.set_crs(epsg=2177, inplace=True)
+    site_gml_id = 'dzialki.238458'
+    site_plot = read_layer(replace(DEFAULT_LAYERS['plots'], where=f"gml_id = '{site_gml_id}'"))
+    
+    # Only data around the site is needed; the layer halos (ANALYSIS_HALO) cover its largest analysis radius
+    region = region_of_interest(polygon=site_plot.geometry.iloc[0])
+    layers = load_layers({name: DEFAULT_LAYERS[name] for name in ['plots', 'roads', 'buildings']}, region)
+    plots, roads, buildings = layers['plots'], layers['roads'], layers['buildings']
     
     # Get the specific site
-    site_gml_id = 'dzialki.238458'
     site = plots[plots['gml_id'] == site_gml_id].iloc[0]
     print(f"Found site: {site_gml_id}")
     
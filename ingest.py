@@ -0,0 +1,19 @@
+import argparse
+from app.layers import DEFAULT_LAYERS, STORE_DIR, ingest_layers
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the GIS source layers into the GeoParquet store")
+    parser.add_argument('--store', default=STORE_DIR, help="Store directory")
+    parser.add_argument('layers', nargs='*', help="Layers to ingest (default: all)")
+    args = parser.parse_args()
+    
+    unknown = set(args.layers) - set(DEFAULT_LAYERS)
+    if unknown:
+        parser.error(f"Unknown layers: {', '.join(sorted(unknown))}")
+    specs = {name: spec for name, spec in DEFAULT_LAYERS.items() if not args.layers or name in args.layers}
+    
+    print(f"Ingesting {len(specs)} layers into {args.store}...")
+    ingest_layers(specs, args.store)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,24 @@
+import os
 from app.programming import get_inputs
 from app.site_search import SiteSearch
+from app.metric_cache import MetricCache
 from app.development_conditions import DevelopmentConditions
-import geopandas as gpd
+from app.site_analysis import analyze_sites
+from app.road_access_cache import ROAD_ACCESS_CACHE
+from app.layers import STORE_DIR, load_bundle, region_of_interest
+from app import figures
+
+# Restrict the search to (minx, miny, maxx, maxy) in EPSG:2177; None searches the whole city
+SEARCH_AREA = None
+
+# Save figures to output/figures instead of showing them (for runs without a display)
+HEADLESS = False
+
+# Road access resolved in earlier runs (access road, road side, frontage per plot)
+ROAD_ACCESS_PATH = 'output/cache/road_access.parquet'
+
+# Development conditions of the top candidates, analyzed in parallel before a site is selected
+TOP_CONDITIONS_PATH = 'output/top_conditions.csv'
 
 def select_site(candidates):
     """Allow user to select a site for further analysis"""
@@ -18,6 +35,9 @@ def select_site(candidates):
             print("Please enter a valid number!")
 
 def main():
+    if HEADLESS:
+        figures.set_headless('output/figures')
+    
     # Step 1: Get project requirements
     print("\n=== Step 1: Define Project Requirements ===")
     retirement_home = get_inputs()
@@ -31,33 +51,18 @@ def main():
     
     # Step 2: Load GIS data
     print("\n=== Step 2: Loading GIS Data ===")
-    plots_gdf = gpd.read_file('data/GIS/2261_dzialki_egib_wfs_gml.gml')
-    roads_gdf = gpd.read_file('data/GIS/2261_ulice_egib_wfs_gml.gml')
-    buildings_gdf = gpd.read_file('data/GIS/budynki_2022.gpkg')
-    churches_gdf = gpd.read_file('data/GIS/churches.gpkg')
-    green_areas_gdf = gpd.read_file('data/GIS/green_areas.gpkg')
-    noise_map_gdf = gpd.read_file('data/GIS/noise/noise_map.gpkg')
+    region = region_of_interest(bbox=SEARCH_AREA) if SEARCH_AREA is not None else None
     senior_density_path = 'data/GIS/old_heatmap.tif'
     
-    # Ensure all data is in EPSG:2177
-    plots_gdf.set_crs("EPSG:2177", inplace=True)
-    roads_gdf.set_crs("EPSG:2177", inplace=True)
-    buildings_gdf.set_crs("EPSG:2177", inplace=True)
-    churches_gdf = churches_gdf.to_crs("EPSG:2177")
-    green_areas_gdf = green_areas_gdf.to_crs("EPSG:2177")
-    noise_map_gdf = noise_map_gdf.to_crs("EPSG:2177")
+    # Layers come from the store written by ingest.py, or from the source files when not ingested
+    layers = load_bundle(senior_density_path, region=region, store_dir=STORE_DIR)
+    plots_gdf = layers.plots
+    roads_gdf = layers.roads
+    buildings_gdf = layers.buildings
     
-    # Step 3: Initialize site search with project requirements
+    # Step 3: Search for sites with project requirements
     print("\n=== Step 3: Searching for Sites ===")
-    site_search = SiteSearch(
-        plots_gdf=plots_gdf,
-        roads_gdf=roads_gdf,
-        buildings_gdf=buildings_gdf,
-        churches_gdf=churches_gdf,
-        green_areas_gdf=green_areas_gdf,
-        noise_map_gdf=noise_map_gdf,
-        senior_density_raster_path=senior_density_path
-    )
+    site_search = SiteSearch.from_bundle(layers, metric_cache=MetricCache('output/cache'))
     
     # Update constraints based on project requirements
     site_search.constraints.min_plot_area = plot_range[0]
@@ -69,6 +74,9 @@ def main():
     # Step 4: Display Results
     print(f"\n=== Step 4: Found {len(candidates)} Potential Sites ===")
     if candidates:
+        # Estimate how robust the top 6 is to uncertainty in the penalty weights
+        stability = site_search.ranking_stability(top_k=6)
+        
         print("\nTop 6 candidates:")
         for i, candidate in enumerate(candidates[:6], 1):
             print(f"\n{i}. Plot {candidate.plot_id}")
@@ -79,6 +87,25 @@ def main():
             print(f"   Distance to nearest church: {candidate.distance_to_nearest_church:.0f}m")
             print(f"   Noise level: {candidate.noise_level:.0f} dB")
             print(f"   Senior density: {candidate.senior_density:.1f}%")
+            print(f"   Probability of staying in top 6: {stability['p_top_6'].iloc[i - 1]:.0%}")
+        
+        # Development conditions of the top 6, analyzed on a process pool
+        if os.path.exists(ROAD_ACCESS_PATH):
+            ROAD_ACCESS_CACHE.load(ROAD_ACCESS_PATH)
+        top_conditions = analyze_sites(
+            candidates[:6], plots_gdf, roads_gdf, buildings_gdf,
+            building_assignment=layers.building_assignment
+        )
+        ROAD_ACCESS_CACHE.save(ROAD_ACCESS_PATH)
+        top_conditions.to_csv(TOP_CONDITIONS_PATH, index=False)
+        print("\nDevelopment conditions of the top 6 candidates:")
+        for row in top_conditions.to_dict('records'):
+            if isinstance(row['error'], str):
+                print(f"{row['rank']}. Plot {row['plot_id']}: {row['error']}")
+            else:
+                print(f"{row['rank']}. Plot {row['plot_id']}: FAR {row['floor_area_ratio']:.2f}, "
+                      f"height {row['height']:.1f}m, estimated GFA {row['estimated_gfa']:.0f} m²")
+        print(f"Saved to: {TOP_CONDITIONS_PATH}")
         
         # Step 5: Visualize Results
         print("\n=== Step 5: Generating Visualizations ===")
@@ -100,11 +127,13 @@ def main():
                 site_candidate=selected_site,
                 plots_gdf=plots_gdf,
                 roads_gdf=roads_gdf,
-                buildings_gdf=buildings_gdf
+                buildings_gdf=buildings_gdf,
+                building_assignment=layers.building_assignment
             )
             
             try:
                 conditions = development.analyze()
+                ROAD_ACCESS_CACHE.save(ROAD_ACCESS_PATH)
                 print("\nDevelopment Conditions:")
                 print(f"Building Coverage Ratio: {conditions['coverage_ratio_min']:.2f} - {conditions['coverage_ratio_max']:.2f}")
                 print(f"Floor Area Ratio: {conditions['floor_area_ratio']:.2f}")